@@ -0,0 +1,64 @@
+"""
+Emits the output of a synthetic build, to be run as the build script
+
+Every output line carries the time it was written at, in microseconds, so
+that the fake API can measure how long it took to reach it.
+
+Usage: python build_script_generator.py <lines> <line_length>
+           <lines_per_cmd> <cmds_per_group> <lines_per_second>
+"""
+
+import sys
+import time
+
+OUTPUT_CHUNK_LINES = 100
+
+def main():
+    """
+    Writes groups of commands with output lines to stdout
+    """
+    line_count = int(sys.argv[1])
+    line_length = int(sys.argv[2])
+    lines_per_cmd = max(1, int(sys.argv[3]))
+    cmds_per_group = max(1, int(sys.argv[4]))
+    lines_per_second = float(sys.argv[5])
+
+    out = sys.stdout
+    padding = 'x' * max(0, line_length - len('bench 0000000000000000 '))
+    started_at = time.time()
+    lines_written = 0
+    cmd = 0
+    while lines_written < line_count:
+        if cmd % cmds_per_group == 0:
+            out.write(
+                '__SH__GROUP__START__|{{"id":"grp{0}"}}|group {0}\n'.format(
+                    cmd))
+        out.write(
+            '__SH__CMD__START__|{{"id":"cmd{0}"}}|command {0}\n'.format(cmd))
+
+        cmd_lines = min(lines_per_cmd, line_count - lines_written)
+        while cmd_lines:
+            chunk_lines = min(cmd_lines, OUTPUT_CHUNK_LINES)
+            line = 'bench {0} {1}\n'.format(
+                int(time.time() * 1000000), padding)
+            out.write(line * chunk_lines)
+            out.flush()
+            cmd_lines -= chunk_lines
+            lines_written += chunk_lines
+
+            if lines_per_second:
+                delay = started_at + lines_written / lines_per_second - \
+                    time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+        out.write('__SH__CMD__END__|{"exitcode":"0"}|command\n')
+        cmd += 1
+        if cmd % cmds_per_group == 0 or lines_written >= line_count:
+            out.write('__SH__GROUP__END__|{"exitcode":"0"}|group\n')
+
+    out.write('__SH__SCRIPT_END_SUCCESS__\n')
+    out.flush()
+
+if __name__ == '__main__':
+    main()
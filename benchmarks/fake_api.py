@@ -0,0 +1,159 @@
+"""
+A local stand-in for the Shippable API that records what reqExec posts
+"""
+
+import BaseHTTPServer
+import json
+import random
+import SocketServer
+import threading
+import time
+import zlib
+
+class FakeShippableApi(object):
+    """
+    Sets up a server on a free local port that responds to
+    buildJobConsoles POSTs after the given latency, and fails the given
+    fraction of them with a 503
+    """
+    def __init__(self, latency=0, failure_rate=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.stats = {
+            'connections': 0,
+            'posts': 0,
+            'failed_posts': 0,
+            'consoles': 0,
+            'bytes': 0,
+            'latencies': [],
+            'first_post_at': None
+        }
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer(
+            ('127.0.0.1', 0), _get_request_handler(self))
+        self._server_thread = None
+
+    @property
+    def url(self):
+        """
+        Returns the URL to use as SHIPPABLE_API_URL
+        """
+        return 'http://127.0.0.1:{0}'.format(self._server.server_address[1])
+
+    def start(self):
+        """
+        Starts serving requests in a background thread
+        """
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever)
+        self._server_thread.daemon = True
+        self._server_thread.start()
+
+    def stop(self):
+        """
+        Stops serving requests
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record_connection(self):
+        """
+        Counts a new connection
+        """
+        with self._lock:
+            self.stats['connections'] += 1
+
+    def record_post(self, body_size, body):
+        """
+        Records a POST and returns the status code to respond with. Output
+        lines of the benchmark build script carry the time they were
+        written, which is used to measure their latency
+        """
+        with self._lock:
+            if self.stats['first_post_at'] is None:
+                self.stats['first_post_at'] = time.time()
+        time.sleep(self.latency)
+        received_at = int(time.time() * 1000000)
+        with self._lock:
+            if random.random() < self.failure_rate:
+                self.stats['failed_posts'] += 1
+                return 503
+
+            consoles = json.loads(body)['buildJobConsoles']
+            self.stats['posts'] += 1
+            self.stats['bytes'] += body_size
+            self.stats['consoles'] += len(consoles)
+            for console in consoles:
+                message = console['message']
+                if not message.startswith('bench '):
+                    continue
+                # Multi-line consoles carry one timestamp per line
+                for line in message.splitlines():
+                    written_at = int(line.split(' ', 2)[1])
+                    self.stats['latencies'].append(
+                        (received_at - written_at) / 1000000.0)
+        return 200
+
+class _ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                           BaseHTTPServer.HTTPServer):
+    """
+    Handles every connection in its own thread
+    """
+    daemon_threads = True
+
+def _get_request_handler(api):
+    """
+    Returns a request handler class that reports to the given fake API
+    """
+    class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        """
+        Handles keep-alive connections from reqExec
+        """
+        protocol_version = 'HTTP/1.1'
+        wbufsize = -1
+
+        def setup(self):
+            BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+            api.record_connection()
+
+        def log_message(self, *args):
+            # pylint: disable=arguments-differ
+            pass
+
+        def do_POST(self):
+            # pylint: disable=invalid-name
+            """
+            Responds to a buildJobConsoles POST
+            """
+            body = self._read_body()
+            body_size = len(body)
+            encoding = self.headers.get('Content-Encoding')
+            if encoding == 'gzip':
+                body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+
+            status_code = api.record_post(body_size, body)
+            self.send_response(status_code)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write('{}')
+            self.wfile.flush()
+
+        def _read_body(self):
+            """
+            Reads a request body sent either with a length or chunked
+            """
+            if self.headers.get('Transfer-Encoding') != 'chunked':
+                return self.rfile.read(int(self.headers['Content-Length']))
+
+            chunks = []
+            while True:
+                chunk_size = int(self.rfile.readline().split(';')[0], 16)
+                if not chunk_size:
+                    self.rfile.readline()
+                    return ''.join(chunks)
+                chunks.append(self.rfile.read(chunk_size))
+                self.rfile.readline()
+
+    return RequestHandler
@@ -0,0 +1,123 @@
+"""
+Measures what masking secrets costs on build output
+
+Masks chunks of generated build output, with a secret leaked every so
+often, for different numbers of secrets. Reports how long the pattern takes
+to compile, and the MB/s of SecretMasker against no masking and against
+replacing every form of every secret one after the other.
+
+Usage: python benchmarks/masking_benchmark.py --help
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from secret_masker import MASK, SecretMasker
+
+def parse_args():
+    """
+    Returns the benchmark options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--secrets', type=int, action='append',
+                        help='number of secrets to mask, 1, 100 and 1000 '
+                        'by default')
+    parser.add_argument('--megabytes', type=int, default=64,
+                        help='build output to mask')
+    parser.add_argument('--chunk-size', type=int, default=65536,
+                        help='bytes masked at a time, as read from the pipe')
+    parser.add_argument('--leak-every', type=int, default=1000,
+                        help='lines between leaked secrets')
+    return parser.parse_args()
+
+def generate_chunks(args, secrets):
+    """
+    Returns chunks of build output that leak a secret, raw or encoded,
+    every so often
+    """
+    lines = []
+    size = 0
+    while size < args.chunk_size:
+        line = 'compiling src/module_{0}/file_{0}.c -O2 -Wall\n'.format(
+            len(lines))
+        if len(lines) % args.leak_every == 0:
+            secret = secrets[len(lines) % len(secrets)]
+            line = 'curl -H "Authorization: Basic {0}" -d token={1}\n'.format(
+                base64.b64encode('user:' + secret), secret)
+        lines.append(line)
+        size += len(line)
+    chunk = ''.join(lines)
+    return [chunk] * (args.megabytes * 1024 * 1024 / len(chunk))
+
+def replace_each(patterns, chunk):
+    """
+    Masks a chunk by replacing the forms of the secrets one by one
+    """
+    for pattern in patterns:
+        chunk = chunk.replace(pattern, MASK)
+    return chunk
+
+def measure(mask, chunks):
+    """
+    Returns the MB/s that the chunks are masked at
+    """
+    started_at = time.time()
+    for chunk in chunks:
+        mask(chunk)
+    elapsed = time.time() - started_at
+    return sum(len(chunk) for chunk in chunks) / elapsed / 1024 / 1024
+
+def run(args, secret_count):
+    """
+    Masks the build output with the given number of secrets and returns
+    the results
+    """
+    config = {'SECRET_ENVS': [], 'MIN_SECRET_LENGTH': 6}
+    secrets = [base64.b64encode(os.urandom(24)) for _ in xrange(secret_count)]
+    chunks = generate_chunks(args, secrets)
+
+    started_at = time.time()
+    secret_masker = SecretMasker(config, secrets)
+    compile_seconds = time.time() - started_at
+
+    # pylint: disable=protected-access
+    patterns = sorted(set(
+        pattern for secret in secrets
+        for pattern in SecretMasker._get_encodings(secret)
+        if len(pattern) >= config['MIN_SECRET_LENGTH']
+    ), key=len, reverse=True)
+
+    masked = secret_masker.mask(chunks[0])
+    results = {
+        'secrets': secret_count,
+        'patterns': len(patterns),
+        'compile_seconds': compile_seconds,
+        'is_masked_as_replace_each':
+            masked == replace_each(patterns, chunks[0]),
+        'unmasked_mb_per_s': measure(lambda chunk: chunk.split('\n'), chunks),
+        'masked_mb_per_s': measure(secret_masker.mask, chunks)
+    }
+    # Replacing each pattern is slow enough with many secrets that a few
+    # chunks are plenty.
+    results['replace_each_mb_per_s'] = measure(
+        lambda chunk: replace_each(patterns, chunk),
+        chunks[:max(1, len(chunks) * 10 / len(patterns))])
+    return results
+
+def main():
+    """
+    Runs the selected numbers of secrets and prints their results
+    """
+    args = parse_args()
+    for secret_count in args.secrets or [1, 100, 1000]:
+        print json.dumps(run(args, secret_count), sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Measures how many console lines per second ConsoleParser can handle
+
+Usage: python benchmarks/parser_benchmark.py [lines] [commands]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from console_id import sequential_console_id_generator
+from console_parser import ConsoleParser
+
+def generate_lines(line_count, cmd_count):
+    """
+    Returns a script output with line_count output lines spread over
+    cmd_count commands in a single group
+    """
+    lines = ['__SH__GROUP__START__|{"id":"grp"}|build\n']
+    lines_per_cmd = max(1, line_count / cmd_count)
+    for cmd in xrange(cmd_count):
+        lines.append('__SH__CMD__START__|{{"id":"cmd{0}"}}|make\n'.format(cmd))
+        for line in xrange(lines_per_cmd):
+            lines.append(
+                'compiling src/module_{0}/file_{1}.c -O2 -Wall\n'.format(
+                    cmd, line))
+        lines.append('__SH__CMD__END__|{"exitcode":"0"}|make\n')
+    lines.append('__SH__GROUP__END__|{"exitcode":"0"}|build\n')
+    lines.append('__SH__SCRIPT_END_SUCCESS__\n')
+    return lines
+
+def main():
+    """
+    Parses the generated output and reports the parse rate
+    """
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    cmd_count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    lines = generate_lines(line_count, cmd_count)
+
+    consoles = []
+    parser = ConsoleParser(
+        {
+            'MAX_CONSOLE_MESSAGE_BYTES': 65536,
+            'COALESCE_CONSOLE_LINES': False,
+            'COALESCE_CONSOLE_LINES_WINDOW_IN_S': 0.5,
+            'COALESCE_CONSOLE_LINES_MAX_BYTES': 16 * 1024
+        },
+        sequential_console_id_generator(),
+        consoles.append,
+        consoles.append
+    )
+    started_at = time.time()
+    for line in lines:
+        parser.parse(line)
+    elapsed = time.time() - started_at
+
+    print '{0} lines in {1:.3f}s: {2:.0f} lines/s'.format(
+        len(lines), elapsed, len(lines) / elapsed)
+
+if __name__ == '__main__':
+    main()
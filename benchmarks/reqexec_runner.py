@@ -0,0 +1,38 @@
+"""
+Runs reqExec through main.main and records the resources it used
+
+Usage: python reqexec_runner.py <usage_path> <script_path> <job_envs_path>
+"""
+
+import json
+import os
+import resource
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main # pylint: disable=wrong-import-position
+
+def run():
+    """
+    Calls main.main with the remaining arguments and writes the CPU time
+    and peak RSS of this process, which excludes the build script, to
+    usage_path
+    """
+    usage_path = sys.argv.pop(1)
+    exit_code = 0
+    try:
+        main.main()
+    except SystemExit as ex:
+        exit_code = ex.code
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    with open(usage_path, 'w') as usage_file:
+        json.dump({
+            'cpu_seconds': usage.ru_utime + usage.ru_stime,
+            'peak_rss_kb': usage.ru_maxrss,
+        }, usage_file)
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    run()
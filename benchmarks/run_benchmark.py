@@ -0,0 +1,139 @@
+"""
+Benchmarks reqExec end to end with a synthetic build and a fake API
+
+Runs both console buffers through main.main against a local stand-in for the
+Shippable API and reports throughput, resource usage, what was posted
+and how long output lines took to reach the API.
+
+Usage: python benchmarks/run_benchmark.py --help
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_api import FakeShippableApi
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONSOLE_BUFFERS = ['memory', 'spool', 'event_loop']
+
+def parse_args():
+    """
+    Returns the benchmark options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, default=200000,
+                        help='output lines written by the build')
+    parser.add_argument('--line-length', type=int, default=80,
+                        help='length of every output line')
+    parser.add_argument('--lines-per-cmd', type=int, default=1000,
+                        help='output lines per command, sets marker density')
+    parser.add_argument('--cmds-per-group', type=int, default=10,
+                        help='commands per group')
+    parser.add_argument('--lines-per-second', type=float, default=0,
+                        help='output rate of the build, 0 for unthrottled')
+    parser.add_argument('--api-latency', type=float, default=0.01,
+                        help='seconds the fake API takes to respond')
+    parser.add_argument('--api-failure-rate', type=float, default=0,
+                        help='fraction of POSTs the fake API fails')
+    parser.add_argument('--console-buffer', choices=CONSOLE_BUFFERS,
+                        action='append',
+                        help='console buffer to run, all of them by default')
+    parser.add_argument('--env', action='append', default=[],
+                        help='extra KEY=VALUE for the job.env')
+    return parser.parse_args()
+
+def write_job(work_dir, args, api_url, console_buffer):
+    """
+    Writes the build script and the job.env for a run, returns their paths
+    """
+    script_path = os.path.join(work_dir, 'script.sh')
+    with open(script_path, 'w') as script:
+        script.write('#!/bin/bash\nexec {0} {1} {2} {3} {4} {5} {6}\n'.format(
+            sys.executable,
+            os.path.join(BENCHMARKS_DIR, 'build_script_generator.py'),
+            args.lines, args.line_length, args.lines_per_cmd,
+            args.cmds_per_group, args.lines_per_second))
+    os.chmod(script_path, 0755)
+
+    job_envs_path = os.path.join(work_dir, 'job.env')
+    with open(job_envs_path, 'w') as job_envs:
+        job_envs.write('\n'.join([
+            'SHIPPABLE_API_URL={0}'.format(api_url),
+            'BUILDER_API_TOKEN=benchmark',
+            'BUILD_JOB_ID=benchmark',
+            'RUN_MODE=production',
+            'BUILD_DIR={0}'.format(work_dir),
+            'CONSOLE_BUFFER={0}'.format(console_buffer),
+        ] + args.env) + '\n')
+
+    return script_path, job_envs_path
+
+def run(args, console_buffer):
+    """
+    Runs the benchmark build with a console buffer and returns its results
+    """
+    api = FakeShippableApi(args.api_latency, args.api_failure_rate)
+    api.start()
+    work_dir = tempfile.mkdtemp()
+    try:
+        script_path, job_envs_path = write_job(
+            work_dir, args, api.url, console_buffer)
+        usage_path = os.path.join(work_dir, 'usage.json')
+
+        started_at = time.time()
+        exit_code = subprocess.call([
+            sys.executable,
+            os.path.join(BENCHMARKS_DIR, 'reqexec_runner.py'),
+            usage_path, script_path, job_envs_path])
+        elapsed = time.time() - started_at
+
+        with open(usage_path) as usage_file:
+            usage = json.load(usage_file)
+    finally:
+        api.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    latencies = sorted(api.stats['latencies'])
+    return {
+        'console_buffer': console_buffer,
+        'exit_code': exit_code,
+        'seconds': elapsed,
+        'lines_per_second': args.lines / elapsed,
+        'cpu_seconds': usage['cpu_seconds'],
+        'peak_rss_kb': usage['peak_rss_kb'],
+        'connections': api.stats['connections'],
+        'posts': api.stats['posts'],
+        'failed_posts': api.stats['failed_posts'],
+        'consoles': api.stats['consoles'],
+        'bytes_sent': api.stats['bytes'],
+        'lines_received': len(latencies),
+        'latency_p50': get_percentile(latencies, 50),
+        'latency_p99': get_percentile(latencies, 99),
+        'latency_max': latencies[-1] if latencies else None
+    }
+
+def get_percentile(values, percentile):
+    """
+    Returns the percentile of sorted values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, len(values) * percentile / 100)]
+
+def main():
+    """
+    Runs the selected console buffers and prints their results
+    """
+    args = parse_args()
+    for console_buffer in args.console_buffer or CONSOLE_BUFFERS:
+        print json.dumps(run(args, console_buffer), sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmarks running many steps in one reqExec server against one-shot runs
+
+Runs the same one line build steps by launching reqExec for every step,
+and by submitting them to a reqExec server over its Unix domain socket,
+one after the other and from concurrent jobs. A stand-in for reqKick's
+client submits the steps, and a local stand-in for the Shippable API
+counts the consoles and connections.
+
+Usage: python benchmarks/server_benchmark.py --help
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fake_api import FakeShippableApi
+from startup_benchmark import write_job
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_PATH = os.path.join(BENCHMARKS_DIR, '..', 'main.py')
+
+def parse_args():
+    """
+    Returns the benchmark options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--steps', type=int, default=50,
+                        help='steps to run in every mode')
+    parser.add_argument('--jobs', type=int, default=4,
+                        help='concurrent jobs submitting steps to the server')
+    parser.add_argument('--api-latency', type=float, default=0.01,
+                        help='seconds the fake API takes to respond')
+    parser.add_argument('--console-buffer', default='memory',
+                        help='console buffer of the steps')
+    parser.add_argument('--env', action='append', default=[],
+                        help='extra KEY=VALUE for the job.env')
+    return parser.parse_args()
+
+def submit(socket_path, script_path, job_envs_path):
+    """
+    Submits a step to the server the way reqKick would, and returns the
+    exit code it responds with
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps({
+            'script_path': script_path,
+            'job_envs_path': job_envs_path
+        }) + '\n')
+        response = json.loads(client.makefile().readline())
+    finally:
+        client.close()
+    return response['exit_code']
+
+def run_one_shot(steps):
+    """
+    Launches reqExec for every step, returns the exit codes
+    """
+    with open(os.devnull, 'w') as devnull:
+        return [subprocess.call([sys.executable, MAIN_PATH] + list(step),
+                                stdout=devnull)
+                for step in steps]
+
+def run_served(steps, socket_path, jobs):
+    """
+    Submits the steps to the server from the given number of concurrent
+    jobs, returns the exit codes
+    """
+    exit_codes = []
+    def run_job(job_steps):
+        """
+        Submits the steps of a job one after the other
+        """
+        for step in job_steps:
+            exit_codes.append(submit(socket_path, *step))
+
+    job_threads = [threading.Thread(target=run_job, args=(steps[job::jobs],))
+                   for job in xrange(jobs)]
+    for job_thread in job_threads:
+        job_thread.start()
+    for job_thread in job_threads:
+        job_thread.join()
+    return exit_codes
+
+def start_server(socket_path):
+    """
+    Starts a reqExec server and waits for it to listen
+    """
+    server = subprocess.Popen(
+        [sys.executable, MAIN_PATH, '--serve', socket_path])
+    while True:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(socket_path)
+            return server
+        except socket.error:
+            time.sleep(0.01)
+        finally:
+            client.close()
+
+def measure(args, mode, run_steps):
+    """
+    Runs the steps in a mode against a fresh fake API and returns the
+    results
+    """
+    api = FakeShippableApi(args.api_latency)
+    api.start()
+    work_dir = tempfile.mkdtemp()
+    try:
+        steps = []
+        for step in xrange(args.steps):
+            step_dir = os.path.join(work_dir, str(step))
+            os.mkdir(step_dir)
+            script_path, job_envs_path, _ = write_job(
+                step_dir, args, api.url, args.console_buffer)
+            steps.append((script_path, job_envs_path))
+
+        started_at = time.time()
+        exit_codes = run_steps(steps, work_dir)
+        elapsed = time.time() - started_at
+    finally:
+        api.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'mode': mode,
+        'steps': args.steps,
+        'failed_steps': len([code for code in exit_codes if code]),
+        'seconds': elapsed,
+        'seconds_per_step': elapsed / args.steps,
+        'connections': api.stats['connections'],
+        'posts': api.stats['posts'],
+        'consoles': api.stats['consoles']
+    }
+
+def main():
+    """
+    Runs the steps one-shot, then served sequentially and concurrently,
+    and prints the results
+    """
+    args = parse_args()
+
+    def serve(jobs):
+        """
+        Returns a function that runs steps in a new server
+        """
+        def run_steps(steps, work_dir):
+            """
+            Starts a server, submits the steps and stops the server
+            """
+            socket_path = os.path.join(work_dir, 'reqExec.sock')
+            server = start_server(socket_path)
+            try:
+                return run_served(steps, socket_path, jobs)
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait()
+        return run_steps
+
+    for mode, run_steps in [
+            ('one_shot', lambda steps, _: run_one_shot(steps)),
+            ('served', serve(1)),
+            ('served_{0}_jobs'.format(args.jobs), serve(args.jobs))]:
+        print json.dumps(measure(args, mode, run_steps), sort_keys=True)
+
+if __name__ == '__main__':
+    main()
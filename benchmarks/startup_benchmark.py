@@ -0,0 +1,135 @@
+"""
+Benchmarks how long reqExec takes to start the build script and to post
+
+Launches reqExec on a build script that prints a single line, against a
+local stand-in for the Shippable API, and reports the time from launch to
+the build script starting and to the first POST reaching the API.
+
+Usage: python benchmarks/startup_benchmark.py --help
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_api import FakeShippableApi
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CONSOLE_BUFFERS = ['memory', 'spool', 'event_loop']
+
+# Writes the time it started at, in seconds, before printing anything
+BUILD_SCRIPT = """#!/bin/bash
+echo ${{EPOCHREALTIME:-$(date +%s.%N)}} > {0}
+echo '__SH__GROUP__START__|{{"id":"grp"}}|group'
+echo '__SH__CMD__START__|{{"id":"cmd"}}|command'
+echo 'hello'
+echo '__SH__CMD__END__|{{"exitcode":"0"}}|command'
+echo '__SH__GROUP__END__|{{"exitcode":"0"}}|group'
+echo '__SH__SCRIPT_END_SUCCESS__'
+"""
+
+def parse_args():
+    """
+    Returns the benchmark options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=20,
+                        help='launches per console buffer')
+    parser.add_argument('--reqexec',
+                        help='path of a packaged reqExec binary, main.py is '
+                        'run with this Python by default')
+    parser.add_argument('--console-buffer', choices=CONSOLE_BUFFERS,
+                        action='append',
+                        help='console buffer to run, all of them by default')
+    parser.add_argument('--env', action='append', default=[],
+                        help='extra KEY=VALUE for the job.env')
+    return parser.parse_args()
+
+def write_job(work_dir, args, api_url, console_buffer):
+    """
+    Writes the build script and the job.env for a run, returns their paths
+    along with the path the script writes its start time to
+    """
+    spawned_at_path = os.path.join(work_dir, 'spawned_at')
+    script_path = os.path.join(work_dir, 'script.sh')
+    with open(script_path, 'w') as script:
+        script.write(BUILD_SCRIPT.format(spawned_at_path))
+    os.chmod(script_path, 0755)
+
+    job_envs_path = os.path.join(work_dir, 'job.env')
+    with open(job_envs_path, 'w') as job_envs:
+        job_envs.write('\n'.join([
+            'SHIPPABLE_API_URL={0}'.format(api_url),
+            'BUILDER_API_TOKEN=benchmark',
+            'BUILD_JOB_ID=benchmark',
+            'RUN_MODE=production',
+            'BUILD_DIR={0}'.format(work_dir),
+            'CONSOLE_BUFFER={0}'.format(console_buffer),
+        ] + args.env) + '\n')
+
+    return script_path, job_envs_path, spawned_at_path
+
+def launch(args, console_buffer):
+    """
+    Launches reqExec once and returns the seconds it took to start the
+    build script, to post for the first time and to exit
+    """
+    api = FakeShippableApi()
+    api.start()
+    work_dir = tempfile.mkdtemp()
+    try:
+        script_path, job_envs_path, spawned_at_path = write_job(
+            work_dir, args, api.url, console_buffer)
+        reqexec = [args.reqexec] if args.reqexec else \
+            [sys.executable, os.path.join(BENCHMARKS_DIR, '..', 'main.py')]
+
+        with open(os.devnull, 'w') as devnull:
+            launched_at = time.time()
+            subprocess.call(reqexec + [script_path, job_envs_path],
+                            stdout=devnull)
+            exited_at = time.time()
+
+        with open(spawned_at_path) as spawned_at_file:
+            spawned_at = float(spawned_at_file.read())
+    finally:
+        api.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return (
+        spawned_at - launched_at,
+        api.stats['first_post_at'] - launched_at,
+        exited_at - launched_at
+    )
+
+def run(args, console_buffer):
+    """
+    Launches reqExec the given number of times with a console buffer and
+    returns the median and 90th percentile of its timings
+    """
+    timings = zip(*[launch(args, console_buffer)
+                    for _ in xrange(args.runs)])
+    results = {'console_buffer': console_buffer}
+    for name, values in zip(
+            ['launch_to_spawn', 'launch_to_first_post', 'launch_to_exit'],
+            timings):
+        values = sorted(values)
+        results[name + '_p50'] = values[len(values) / 2]
+        results[name + '_p90'] = values[len(values) * 9 / 10]
+    return results
+
+def main():
+    """
+    Runs the selected console buffers and prints their results
+    """
+    args = parse_args()
+    for console_buffer in args.console_buffer or CONSOLE_BUFFERS:
+        print json.dumps(run(args, console_buffer), sort_keys=True)
+
+if __name__ == '__main__':
+    main()
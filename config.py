@@ -3,6 +3,7 @@ Config required to execute a script
 """
 
 import logging
+import os
 
 class Config(dict):
     """
@@ -51,5 +52,163 @@ class Config(dict):
             int(self.get('MAX_LOG_LINES_TO_FLUSH', 20))
         self['MAX_LOGS_FLUSH_WAIT_TIME_IN_S'] = \
             float(self.get('MAX_LOGS_FLUSH_WAIT_TIME_IN_S', 3))
-        self['LOGS_FILE_READ_WAIT_TIME_IN_S'] = \
-            float(self.get('LOGS_FILE_READ_WAIT_TIME_IN_S', 0.1))
+
+        self._set_console_buffer_config()
+
+        # Adaptive flushing, off unless turned on, between the minimum
+        # interval and the flush interval or wait time above, and between the
+        # buffer length or lines to flush above and the maximum batch length
+        self['ADAPTIVE_CONSOLE_FLUSH'] = \
+            self.get('ADAPTIVE_CONSOLE_FLUSH') == 'true'
+        self['MIN_CONSOLE_FLUSH_INTERVAL_IN_S'] = \
+            float(self.get('MIN_CONSOLE_FLUSH_INTERVAL_IN_S', 0.25))
+        self['MAX_CONSOLE_BATCH_LENGTH'] = \
+            int(self.get('MAX_CONSOLE_BATCH_LENGTH', 2000))
+
+        # Script output reader
+        self['CONSOLE_READ_CHUNK_SIZE'] = \
+            int(self.get('CONSOLE_READ_CHUNK_SIZE', 65536))
+        self['PARTIAL_LINE_FLUSH_TIMEOUT_IN_S'] = \
+            float(self.get('PARTIAL_LINE_FLUSH_TIMEOUT_IN_S', 1))
+        self['MAX_PARTIAL_LINE_LENGTH'] = \
+            int(self.get('MAX_PARTIAL_LINE_LENGTH', 65536))
+
+        # Progress output rewritten with carriage returns is collapsed into
+        # the final state of the line, and ANSI sequences can be stripped
+        self['COLLAPSE_CARRIAGE_RETURNS'] = \
+            self.get('COLLAPSE_CARRIAGE_RETURNS', 'true') == 'true'
+        self['STRIP_ANSI_SEQUENCES'] = \
+            self.get('STRIP_ANSI_SEQUENCES') == 'true'
+
+        # Consecutive plain lines of a command that arrive within the window
+        # can be coalesced into a single console, up to the size limit
+        self['COALESCE_CONSOLE_LINES'] = \
+            self.get('COALESCE_CONSOLE_LINES') == 'true'
+        self['COALESCE_CONSOLE_LINES_WINDOW_IN_S'] = \
+            float(self.get('COALESCE_CONSOLE_LINES_WINDOW_IN_S', 0.5))
+        self['COALESCE_CONSOLE_LINES_MAX_BYTES'] = \
+            int(self.get('COALESCE_CONSOLE_LINES_MAX_BYTES', 16 * 1024))
+
+        # Console batch limits
+        self['MAX_CONSOLE_BATCH_BYTES'] = \
+            int(self.get('MAX_CONSOLE_BATCH_BYTES', 512 * 1024))
+        self['MAX_CONSOLE_MESSAGE_BYTES'] = \
+            int(self.get('MAX_CONSOLE_MESSAGE_BYTES', 64 * 1024))
+
+        # Memory taken by console batches waiting to be posted. Past it they
+        # spill to disk, and once the spill is full as well the overflow
+        # policy applies, either block reading script output or drop them
+        self['MAX_CONSOLE_MEMORY_BYTES'] = \
+            int(self.get('MAX_CONSOLE_MEMORY_BYTES', 16 * 1024 * 1024))
+        self['MAX_CONSOLE_SPILL_BYTES'] = \
+            int(self.get('MAX_CONSOLE_SPILL_BYTES', 256 * 1024 * 1024))
+        self['CONSOLE_OVERFLOW_POLICY'] = \
+            self.get('CONSOLE_OVERFLOW_POLICY', 'block')
+        if self['CONSOLE_OVERFLOW_POLICY'] not in ['block', 'drop']:
+            raise Exception('Invalid CONSOLE_OVERFLOW_POLICY {0}'.format(
+                self['CONSOLE_OVERFLOW_POLICY']))
+
+        # Directory to keep console spools in until they are posted, if set
+        # they can be drained by a later run in case this one doesn't finish
+        self['CONSOLE_SPOOL_DIR'] = self.get('CONSOLE_SPOOL_DIR')
+
+        # Console ids, either sequential or uuid4
+        self['CONSOLE_ID_GENERATOR'] = \
+            self.get('CONSOLE_ID_GENERATOR', 'sequential')
+        if self['CONSOLE_ID_GENERATOR'] not in ['sequential', 'uuid4']:
+            raise Exception('Invalid CONSOLE_ID_GENERATOR {0}'.format(
+                self['CONSOLE_ID_GENERATOR']))
+
+        # Run stats, written to a file and/or posted in a hidden console group
+        self['REQEXEC_STATS_PATH'] = self.get('REQEXEC_STATS_PATH')
+        self['POST_REQEXEC_STATS'] = \
+            self.get('POST_REQEXEC_STATS') == 'true'
+
+        # Sampling profiler, writes collapsed stacks of all threads to
+        # REQEXEC_PROFILE if set
+        self['REQEXEC_PROFILE'] = self.get('REQEXEC_PROFILE')
+        self['REQEXEC_PROFILE_INTERVAL_IN_S'] = \
+            float(self.get('REQEXEC_PROFILE_INTERVAL_IN_S', 0.01))
+        self['REQEXEC_PROFILE_MAX_DEPTH'] = \
+            int(self.get('REQEXEC_PROFILE_MAX_DEPTH', 64))
+
+        self._set_secret_masking_config()
+        self._set_shippable_api_config()
+
+    def _set_console_buffer_config(self):
+        """
+        Initialize config of where consoles are buffered until they are
+        posted
+        """
+        # Either in memory, spooled to a log file, as the new build runner
+        # does, or in memory and flushed from a single threaded event loop
+        default_console_buffer = 'memory'
+        if self['IS_NEW_BUILD_RUNNER_SUBSCRIPTION']:
+            default_console_buffer = 'spool'
+        self['CONSOLE_BUFFER'] = \
+            self.get('CONSOLE_BUFFER', default_console_buffer)
+        if self['CONSOLE_BUFFER'] not in ['memory', 'spool', 'event_loop']:
+            raise Exception('Invalid CONSOLE_BUFFER {0}'.format(
+                self['CONSOLE_BUFFER']))
+
+        # The event loop waits for output and flushes with select(), which
+        # doesn't support pipes on Windows, so flushes would only run as
+        # output arrives. The memory buffer flushes on a thread instead.
+        if self['CONSOLE_BUFFER'] == 'event_loop' and os.name == 'nt':
+            self['CONSOLE_BUFFER'] = 'memory'
+
+    def _set_secret_masking_config(self):
+        """
+        Initialize config of the secrets masked in script output
+        """
+        # Values of the job ENVs listed in SECRET_ENVS, comma separated, are
+        # masked along with their base64 and URL-encoded forms. Values
+        # shorter than the minimum length aren't masked
+        self['SECRET_ENVS'] = [
+            env.strip() for env in
+            self.get('SECRET_ENVS', 'BUILDER_API_TOKEN').split(',')
+            if env.strip()
+        ]
+        self['MIN_SECRET_LENGTH'] = \
+            max(1, int(self.get('MIN_SECRET_LENGTH', 6)))
+
+    def _set_shippable_api_config(self):
+        """
+        Initialize config of the requests to the Shippable API
+        """
+        # Shippable API connection pool
+        self['SHIPPABLE_API_POOL_SIZE'] = \
+            int(self.get('SHIPPABLE_API_POOL_SIZE', 4))
+        self['SHIPPABLE_API_CONNECT_TIMEOUT_IN_S'] = \
+            float(self.get('SHIPPABLE_API_CONNECT_TIMEOUT_IN_S', 10))
+        self['SHIPPABLE_API_READ_TIMEOUT_IN_S'] = \
+            float(self.get('SHIPPABLE_API_READ_TIMEOUT_IN_S', 30))
+
+        # Number of console batches that are POSTed concurrently
+        self['SHIPPABLE_API_MAX_IN_FLIGHT_BATCHES'] = \
+            int(self.get('SHIPPABLE_API_MAX_IN_FLIGHT_BATCHES', 4))
+
+        # Shippable API retries
+        self['SHIPPABLE_API_MAX_RETRIES'] = \
+            int(self.get('SHIPPABLE_API_MAX_RETRIES', 10))
+        self['SHIPPABLE_API_MAX_RETRY_INTERVAL_IN_S'] = \
+            float(self.get('SHIPPABLE_API_MAX_RETRY_INTERVAL_IN_S', 60))
+        self['SHIPPABLE_API_DRAIN_TIMEOUT_IN_S'] = \
+            float(self.get('SHIPPABLE_API_DRAIN_TIMEOUT_IN_S', 300))
+
+        # Console batches can be streamed with chunked transfer encoding
+        # rather than serialized into a single string before they're sent
+        self['SHIPPABLE_API_STREAM_REQUESTS'] = \
+            self.get('SHIPPABLE_API_STREAM_REQUESTS') == 'true'
+
+        # Shippable API request compression, one of gzip, deflate or none
+        self['SHIPPABLE_API_CONTENT_ENCODING'] = \
+            self.get('SHIPPABLE_API_CONTENT_ENCODING', 'none')
+        if self['SHIPPABLE_API_CONTENT_ENCODING'] not in \
+            ['gzip', 'deflate', 'none']:
+            raise Exception('Invalid SHIPPABLE_API_CONTENT_ENCODING {0}'
+                            .format(self['SHIPPABLE_API_CONTENT_ENCODING']))
+        self['SHIPPABLE_API_COMPRESSION_LEVEL'] = \
+            int(self.get('SHIPPABLE_API_COMPRESSION_LEVEL', 6))
+        self['SHIPPABLE_API_COMPRESSION_MIN_BYTES'] = \
+            int(self.get('SHIPPABLE_API_COMPRESSION_MIN_BYTES', 1024))
@@ -0,0 +1,143 @@
+"""
+Bounds the memory taken by console batches that are waiting to be posted
+"""
+
+import os
+import tempfile
+import threading
+import time
+from console_spool import ConsoleSpool
+from request_body import get_body_size, join_body
+
+class ConsoleBacklog(object):
+    """
+    Sets up the memory ceiling for request bodies waiting to be posted, the
+    spill file that takes the ones over it and the policy for when the spill
+    is full as well:
+
+    block: the caller waits until there is room, which stops reading script
+           output and in turn blocks the script once the pipe fills up
+    drop:  the body is dropped, close() returns the number of bytes dropped
+           so that a notice can be posted
+    """
+    def __init__(self, config, shippable_adapter, run_stats):
+        self._config = config
+        self._shippable_adapter = shippable_adapter
+        self._run_stats = run_stats
+        self._lock = threading.Lock()
+        self._is_closed = False
+
+        # Bodies are spilled in order and posted in order, a body that was
+        # read back from the spill waits for room in _spilled_body.
+        self._spill = None
+        self._spill_size = 0
+        self._spilled_body = None
+        self._dropped_bytes = 0
+
+    def post(self, data):
+        """
+        Posts a request body if there is room for it in memory, otherwise
+        spills it to disk or applies the overflow policy
+        """
+        with self._lock:
+            if self._is_closed:
+                self._shippable_adapter.post_build_job_consoles(data)
+                return
+
+            size = get_body_size(data)
+            self._post_spilled(0)
+            if not self._spill_size and self._has_room(size, 0):
+                self._shippable_adapter.post_build_job_consoles(data)
+            elif self._spill_size + size + 1 <= \
+                self._config['MAX_CONSOLE_SPILL_BYTES']:
+                self._write_spill(data)
+            elif self._config['CONSOLE_OVERFLOW_POLICY'] == 'drop':
+                self._dropped_bytes += size
+                self._run_stats.increment('console_bytes_dropped', size)
+            else:
+                started_at = time.time()
+                self._post_spilled(None)
+                self._has_room(size, None)
+                self._shippable_adapter.post_build_job_consoles(data)
+                self._run_stats.record_time(
+                    'backpressure', time.time() - started_at)
+
+    def refill(self):
+        """
+        Posts spilled bodies for which there is room in memory by now
+        """
+        with self._lock:
+            self._post_spilled(0)
+
+    def is_spilled(self):
+        """
+        Returns whether there are spilled bodies waiting to be posted
+        """
+        return self._spill_size > 0
+
+    def close(self):
+        """
+        Posts the bodies left in the spill, waiting up to the drain timeout
+        for room, and removes the spill. Bodies posted from here on are
+        handed over to the adapter as they are. Returns the number of bytes
+        that had to be dropped
+        """
+        with self._lock:
+            self._is_closed = True
+            self._post_spilled(
+                time.time() + self._config['SHIPPABLE_API_DRAIN_TIMEOUT_IN_S'])
+            if self._spill:
+                if self._spill_size:
+                    self._dropped_bytes += \
+                        self._spill_size - self._spill.read_offset
+                    if self._spilled_body:
+                        self._dropped_bytes += len(self._spilled_body)
+                    self._spilled_body = None
+                self._spill.finish(0)
+                self._spill = None
+            return self._dropped_bytes
+
+    def _has_room(self, size, timeout):
+        """
+        Waits up to the timeout for there to be room in memory for a body of
+        the given size. A body larger than the ceiling fits once nothing
+        else is pending
+        """
+        return self._shippable_adapter.wait_for_pending_bytes(
+            max(0, self._config['MAX_CONSOLE_MEMORY_BYTES'] - size), timeout)
+
+    def _write_spill(self, data):
+        """
+        Appends a body to the spill, creating it on first use
+        """
+        if not self._spill:
+            self._spill = ConsoleSpool(
+                os.path.join(tempfile.mkdtemp(), 'backlog'), False)
+        data = join_body(data)
+        self._spill.write(data + '\n')
+        self._spill_size += len(data) + 1
+        self._run_stats.increment('console_bytes_spilled', len(data))
+        self._run_stats.record_max('console_spill_bytes', self._spill_size)
+
+    def _post_spilled(self, deadline):
+        """
+        Posts spilled bodies in order as long as there is room for them, or
+        there is room for them before the deadline if one is given. The
+        spill is emptied once it has been read to the end
+        """
+        while self._spill_size:
+            if self._spilled_body is None:
+                line = self._spill.readline()
+                if not line:
+                    self._spill.truncate()
+                    self._spill_size = 0
+                    return
+                self._spilled_body = line[:-1]
+
+            timeout = None if deadline is None else \
+                max(0, deadline - time.time())
+            if not self._has_room(len(self._spilled_body), timeout):
+                return
+            self._shippable_adapter.post_build_job_consoles(
+                self._spilled_body)
+            self._spilled_body = None
@@ -0,0 +1,155 @@
+"""
+Collects consoles into request bodies for the buildJobConsoles API
+"""
+
+import json
+import traceback
+from console_message import get_message, serialize_console
+from request_body import get_body_size
+
+# Rough serialized size of a console without its message, used to estimate
+# the size of a batch without serializing every console as it's added.
+CONSOLE_OVERHEAD_BYTES = 192
+
+class ConsoleBatch(object):
+    """
+    Sets up the limits on the number of consoles and the serialized size
+    of a batch
+    """
+    def __init__(self, config, max_consoles):
+        self._build_job_id = config['BUILD_JOB_ID']
+        self._max_bytes = config['MAX_CONSOLE_BATCH_BYTES']
+        self._is_streamed = config['SHIPPABLE_API_STREAM_REQUESTS']
+        self._consoles = []
+        self._size = 0
+
+        # ------
+        # Public
+        # ------
+        self.max_consoles = max_consoles
+
+    def __len__(self):
+        return len(self._consoles)
+
+    def append(self, console):
+        """
+        Adds a console to the batch
+        """
+        self._consoles.append(console)
+        self._size += self._get_size(console)
+
+    def fits(self, console):
+        """
+        Returns whether a console can be added without going over the byte
+        limit. An empty batch always fits a console
+        """
+        return not self._consoles or \
+            self._size + self._get_size(console) <= self._max_bytes
+
+    def is_full(self):
+        """
+        Returns whether either the console or the byte limit is reached
+        """
+        return len(self._consoles) >= self.max_consoles or \
+            self._size >= self._max_bytes
+
+    def flush(self, append_error):
+        """
+        Empties the batch and returns it as a list of request bodies, each
+        within the byte limit. Consoles that cannot be serialized are
+        reported to append_error and left out
+        """
+        consoles = self._consoles
+        self._consoles = []
+        self._size = 0
+        if not consoles:
+            return []
+
+        # If there is an exception in stringifying the data, test each
+        # console to ensure only the sanitized ones are sent. Testing on
+        # failure will ensure that we don't test unnecessarily.
+        try:
+            data = self._serialize(consoles)
+        except Exception:
+            sanitized_consoles = []
+            for console in consoles:
+                try:
+                    serialize_console(console)
+                    sanitized_consoles.append(console)
+                except Exception as ex:
+                    trace = traceback.format_exc()
+                    error = '{0}: {1}'.format(str(ex), trace)
+                    append_error(error)
+            consoles = sanitized_consoles
+            if not consoles:
+                return []
+            data = self._serialize(consoles)
+
+        return self._split(consoles, data)
+
+    def _split(self, consoles, data):
+        """
+        Halves a batch whose estimated size was too low, e.g. because of
+        escaped characters, until every part is within the byte limit
+        """
+        if get_body_size(data) <= self._max_bytes or len(consoles) == 1:
+            return [data]
+
+        middle = len(consoles) / 2
+        first_half = consoles[:middle]
+        second_half = consoles[middle:]
+        return self._split(first_half, self._serialize(first_half)) + \
+            self._split(second_half, self._serialize(second_half))
+
+    @staticmethod
+    def _get_size(console):
+        """
+        Estimates the serialized size of a console from its message
+        """
+        return len(get_message(console)) + CONSOLE_OVERHEAD_BYTES
+
+    def _serialize(self, consoles):
+        """
+        Returns the request body for a list of consoles
+        """
+        return self._join([serialize_console(console) for console in consoles])
+
+    def _join(self, serialized_consoles):
+        """
+        Returns the request body for a list of serialized consoles. Streamed
+        bodies are left as a list of chunks instead of being joined into a
+        string, so that they're never held in memory twice
+        """
+        if not self._is_streamed:
+            return '{{"buildJobId": {0}, "buildJobConsoles": [{1}]}}'.format(
+                json.dumps(self._build_job_id), ', '.join(serialized_consoles))
+
+        chunks = [', '] * (2 * len(serialized_consoles) - 1)
+        chunks[::2] = serialized_consoles
+        return ['{{"buildJobId": {0}, "buildJobConsoles": ['.format(
+            json.dumps(self._build_job_id))] + chunks + [']}']
+
+class SerializedConsoleBatch(ConsoleBatch):
+    """
+    Collects consoles that are already serialized to JSON. They are spliced
+    into the request body as they are, without being decoded and encoded
+    again
+    """
+    def flush(self, append_error):
+        """
+        Empties the batch and returns it as a list with a single request body
+        """
+        consoles = self._consoles
+        self._consoles = []
+        self._size = 0
+        if not consoles:
+            return []
+
+        return [self._join(consoles)]
+
+    @staticmethod
+    def _get_size(console):
+        """
+        Returns the size of a serialized console
+        """
+        return len(console)
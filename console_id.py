@@ -0,0 +1,49 @@
+"""
+Generates ids for build job consoles
+"""
+
+import binascii
+import itertools
+import os
+
+def get_console_id_generator(config):
+    """
+    Returns a function that returns a new console id every time it is
+    called, as selected by CONSOLE_ID_GENERATOR
+    """
+    if config['CONSOLE_ID_GENERATOR'] == 'uuid4':
+        return random_console_id
+    return sequential_console_id_generator()
+
+def random_console_id():
+    """
+    Returns a random uuid4 console id. Every id costs a call to
+    os.urandom
+    """
+    # The same as str(uuid.uuid4()), importing uuid takes a good part of
+    # reqExec's startup time though, as it looks up libuuid through ctypes.
+    value = int(binascii.hexlify(os.urandom(16)), 16)
+    value = value & ~(0xf000 << 64) | 0x4000 << 64
+    value = value & ~(0xc000 << 48) | 0x8000 << 48
+    digits = '%032x' % value
+    return '%s-%s-%s-%s-%s' % (digits[:8], digits[8:12], digits[12:16],
+                               digits[16:20], digits[20:])
+
+def sequential_console_id_generator():
+    """
+    Returns a function that generates console ids from a random prefix,
+    picked once per run, followed by a counter. The ids keep the uuid4
+    format and the 74 random bits of the prefix keep them unique across
+    runs, while each new id only costs a counter increment.
+    """
+    run_id = random_console_id()
+    prefix = run_id[:24]
+    counter = itertools.count()
+
+    def sequential_console_id():
+        """
+        Returns the next console id of this run
+        """
+        return '%s%012x' % (prefix, next(counter))
+
+    return sequential_console_id
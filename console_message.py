@@ -0,0 +1,56 @@
+"""
+Compact form of the plain output lines of a command
+"""
+
+import json
+from json.encoder import encode_basestring_ascii
+from operator import itemgetter
+
+MESSAGE_TEMPLATE = \
+    '{"consoleId": %s, "parentConsoleId": %s, "type": "msg", ' \
+    '"message": %s, "timestamp": %d}'
+
+class ConsoleMessage(tuple):
+    """
+    A plain line of output of a command, as a (console_id, encoded_parent_id,
+    message, timestamp) tuple. These make up almost all of the consoles, so
+    they are kept in this form rather than as a dict until they are
+    serialized. A tuple takes a third of the memory of the dict and, unlike
+    a class with __slots__, is created without running any Python code. The
+    parent id is kept JSON encoded, as a single string shared by all lines of
+    the command
+    """
+    __slots__ = ()
+
+    console_id = property(itemgetter(0))
+    encoded_parent_id = property(itemgetter(1))
+    message = property(itemgetter(2))
+    timestamp = property(itemgetter(3))
+
+    def to_json(self):
+        """
+        Returns the console serialized to JSON, the same as json.dumps would
+        serialize it as a dict
+        """
+        return MESSAGE_TEMPLATE % (
+            encode_basestring_ascii(self[0]),
+            self[1],
+            encode_basestring_ascii(self[2]),
+            self[3]
+        )
+
+def serialize_console(console):
+    """
+    Returns a console serialized to JSON, either a ConsoleMessage or a dict
+    """
+    if isinstance(console, ConsoleMessage):
+        return console.to_json()
+    return json.dumps(console)
+
+def get_message(console):
+    """
+    Returns the message of a console, either a ConsoleMessage or a dict
+    """
+    if isinstance(console, ConsoleMessage):
+        return console.message
+    return console['message']
@@ -0,0 +1,256 @@
+"""
+Parses script output into build job consoles
+"""
+
+import json
+import time
+from console_message import ConsoleMessage
+
+MARKER_PREFIX = '__SH__'
+
+class ConsoleParser(object):
+    """
+    Sets up the console id generator and the callbacks that receive parsed
+    consoles and orphan lines, along with the group and command state of
+    the script
+    """
+    def __init__(self, config, new_console_id, append_console, append_error):
+        self._max_message_bytes = config['MAX_CONSOLE_MESSAGE_BYTES']
+        self._is_coalescing = config['COALESCE_CONSOLE_LINES']
+        self._coalesce_window = \
+            int(config['COALESCE_CONSOLE_LINES_WINDOW_IN_S'] * 1000000)
+        self._coalesce_max_bytes = min(
+            config['COALESCE_CONSOLE_LINES_MAX_BYTES'],
+            self._max_message_bytes)
+        self._new_console_id = new_console_id
+        self._append_console = append_console
+        self._append_error = append_error
+
+        # Console state
+        self._current_group_info = None
+        self._current_group_name = None
+        self._current_cmd_info = None
+        self._encoded_cmd_id = None
+        self._show_group = None
+
+        # Lines being coalesced into a single console, along with their
+        # total size and the timestamp of the first one
+        self._coalesced_lines = []
+        self._coalesced_size = 0
+        self._coalesced_timestamp = None
+
+        # Marker lines are rare, so they are matched in order only once the
+        # common prefix check has passed.
+        self._marker_handlers = (
+            ('__SH__GROUP__START__', self._handle_group_start),
+            ('__SH__CMD__START__', self._handle_cmd_start),
+            ('__SH__CMD__END__', self._handle_cmd_end),
+            ('__SH__GROUP__END__', self._handle_group_end),
+            ('__SH__SCRIPT_END_SUCCESS__', self._handle_script_end_success),
+            ('__SH__SCRIPT_END_FAILURE__', self._handle_script_end_failure)
+        )
+
+    def parse(self, line):
+        """
+        Parses a single line of console output and pushes it to the console
+        callback. This also returns whether the console line is successful
+        and the script is complete
+        """
+        timestamp = int(time.time() * 1000000)
+        if line.startswith(MARKER_PREFIX):
+            for marker, handler in self._marker_handlers:
+                if line.startswith(marker):
+                    self.flush()
+                    return handler(line, timestamp)
+
+        # Plain output, by far the most common case.
+        encoded_cmd_id = self._encoded_cmd_id
+        if not encoded_cmd_id:
+            self._append_error(line)
+        elif self._is_coalescing and self._coalesce(line, timestamp):
+            # Held until the coalesced lines are flushed
+            pass
+        elif len(line) <= self._max_message_bytes:
+            self._append_console(ConsoleMessage(
+                (self._new_console_id(), encoded_cmd_id, line, timestamp)))
+        else:
+            for message in split_message(line, self._max_message_bytes):
+                self._append_console(ConsoleMessage(
+                    (self._new_console_id(), encoded_cmd_id, message,
+                     timestamp)))
+
+        return False, False
+
+    def flush(self):
+        """
+        Pushes the lines coalesced so far, if any, as a single console
+        """
+        if not self._coalesced_lines:
+            return
+
+        self._append_console(ConsoleMessage((
+            self._new_console_id(), self._encoded_cmd_id,
+            ''.join(self._coalesced_lines), self._coalesced_timestamp)))
+        self._coalesced_lines = []
+        self._coalesced_size = 0
+        self._coalesced_timestamp = None
+
+    def _coalesce(self, line, timestamp):
+        """
+        Adds a line to the ones being coalesced, after flushing them if the
+        line is past their window or size limit. An empty line, which the
+        reader yields once output goes idle, only flushes them. Returns
+        False for a line that is too long to be coalesced
+        """
+        if self._coalesced_lines and (
+                not line or
+                timestamp - self._coalesced_timestamp >
+                self._coalesce_window or
+                self._coalesced_size + len(line) > self._coalesce_max_bytes):
+            self.flush()
+
+        if len(line) > self._coalesce_max_bytes:
+            return False
+        if line:
+            if not self._coalesced_lines:
+                self._coalesced_timestamp = timestamp
+            self._coalesced_lines.append(line)
+            self._coalesced_size += len(line)
+        return True
+
+    def _get_group_id(self):
+        """
+        Returns the id of the current group, if any
+        """
+        return self._current_group_info.get('id') if \
+            self._current_group_info else None
+
+    def _handle_group_start(self, line, timestamp):
+        """
+        Starts a new group of commands
+        """
+        line_split = line.split('|')
+        self._current_group_name = '|'.join(line_split[2:])
+        self._current_group_info = json.loads(line_split[1])
+        self._show_group = self._current_group_info.get('is_shown', True)
+        if self._show_group == 'false':
+            self._show_group = False
+        self._append_console({
+            'consoleId': self._current_group_info.get('id'),
+            'parentConsoleId': 'root',
+            'type': 'grp',
+            'message': self._current_group_name,
+            'timestamp': timestamp,
+            'isShown': self._show_group
+        })
+        return False, False
+
+    def _handle_cmd_start(self, line, timestamp):
+        """
+        Starts a new command in the current group
+        """
+        line_split = line.split('|')
+        current_cmd_name = '|'.join(line_split[2:])
+        self._current_cmd_info = json.loads(line_split[1])
+        cmd_id = self._current_cmd_info.get('id')
+        self._encoded_cmd_id = json.dumps(cmd_id) if cmd_id else None
+        parent_id = self._get_group_id()
+        if parent_id:
+            self._append_console({
+                'consoleId': self._current_cmd_info.get('id'),
+                'parentConsoleId': parent_id,
+                'type': 'cmd',
+                'message': current_cmd_name,
+                'timestamp': timestamp,
+            })
+        return False, False
+
+    def _handle_cmd_end(self, line, timestamp):
+        """
+        Ends the current command along with its status
+        """
+        line_split = line.split('|')
+        current_cmd_end_name = '|'.join(line_split[2:])
+        current_cmd_end_info = json.loads(line_split[1])
+        parent_id = self._get_group_id()
+        if parent_id:
+            self._append_console({
+                'consoleId': self._current_cmd_info.get('id'),
+                'parentConsoleId': parent_id,
+                'type': 'cmd',
+                'message': current_cmd_end_name,
+                'timestamp': timestamp,
+                'timestampEndedAt': timestamp,
+                'isSuccess': current_cmd_end_info.get('exitcode') == '0',
+                'isShown': self._show_group
+            })
+        return False, False
+
+    def _handle_group_end(self, line, timestamp):
+        """
+        Ends the current group along with its status
+        """
+        line_split = line.split('|')
+        current_grp_end_name = '|'.join(line_split[2:])
+        current_grp_end_info = json.loads(line_split[1])
+        self._append_console({
+            'consoleId': self._current_group_info.get('id'),
+            'parentConsoleId': 'root',
+            'type': 'grp',
+            'message': current_grp_end_name,
+            'timestamp': timestamp,
+            'timestampEndedAt': timestamp,
+            'isSuccess': current_grp_end_info.get('exitcode') == '0',
+            'isShown': self._show_group
+        })
+        return False, False
+
+    @staticmethod
+    def _handle_script_end_success(line, timestamp):
+        """
+        Marks the script as complete and successful
+        """
+        # pylint: disable=unused-argument
+        return True, True
+
+    @staticmethod
+    def _handle_script_end_failure(line, timestamp):
+        """
+        Marks the script as complete and failed
+        """
+        # pylint: disable=unused-argument
+        return False, True
+
+def split_message(message, max_bytes):
+    """
+    Splits a message into parts of at most max_bytes, without splitting
+    UTF-8 encoded characters
+    """
+    parts = []
+    start = 0
+    while len(message) - start > max_bytes:
+        end = get_character_boundary(message, start + max_bytes)
+        if end <= start:
+            end = start + max_bytes
+        parts.append(message[start:end])
+        start = end
+    parts.append(message[start:])
+    return parts
+
+def get_character_boundary(text, end):
+    """
+    Returns end, or the offset of the first byte of the UTF-8 encoded
+    character that end would split
+    """
+    # Back off over the continuation bytes to the first byte of the
+    # character, a character is at most 4 bytes long.
+    start = end
+    while start > 0 and end - start < 3 and \
+        '\x80' <= text[start - 1] <= '\xbf':
+        start -= 1
+    if start > 0 and text[start - 1] >= '\xc0':
+        first_byte = text[start - 1]
+        length = 2 if first_byte < '\xe0' else 3 if first_byte < '\xf0' else 4
+        if start - 1 + length > end:
+            return start - 1
+    return end
@@ -0,0 +1,196 @@
+"""
+Reads script output from a pipe in large chunks and splits it into lines
+"""
+
+from cStringIO import StringIO
+import itertools
+import os
+import re
+import select
+import time
+from console_parser import get_character_boundary
+from secret_masker import SecretMasker
+
+# CSI sequences such as colors and cursor movement, OSC sequences such as
+# window titles, and two character escape sequences.
+ANSI_SEQUENCE = re.compile(
+    r'\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]')
+ERASE_IN_LINE = re.compile(r'\x1b\[[0-2]?K')
+
+class ConsoleReader(object):
+    """
+    Sets up the stream to read from along with chunk size and partial line
+    limits, and the secrets to mask in the output. The scheduler, if given,
+    has deadlines to run while waiting for output: get_timeout() returns the
+    seconds until the next one or None, and run_due() runs those that are
+    due
+    """
+    def __init__(self, stream, config, run_stats, scheduler=None):
+        self._fd = stream.fileno()
+        self._run_stats = run_stats
+        self._scheduler = scheduler
+        self._chunk_size = config['CONSOLE_READ_CHUNK_SIZE']
+        self._partial_line_timeout = \
+            config['PARTIAL_LINE_FLUSH_TIMEOUT_IN_S']
+        self._max_partial_line_length = config['MAX_PARTIAL_LINE_LENGTH']
+        self._collapse_carriage_returns = config['COLLAPSE_CARRIAGE_RETURNS']
+        self._strip_ansi_sequences = config['STRIP_ANSI_SEQUENCES']
+        self._secret_masker = SecretMasker(config)
+        self._idle_timeout = None
+        if config['COALESCE_CONSOLE_LINES']:
+            self._idle_timeout = config['COALESCE_CONSOLE_LINES_WINDOW_IN_S']
+
+        # select() doesn't support pipes on Windows, partial lines are only
+        # emitted once they hit the length limit there.
+        self._can_wait = os.name != 'nt'
+
+    def lines(self):
+        """
+        Yields lines, including the trailing newline, as they are read from
+        the stream. A line without a trailing newline is yielded if no more
+        output arrives within the partial line timeout, or if it grows past
+        the maximum partial line length. Secrets are masked and lines are
+        normalized to what a terminal would show, see _normalize. A secret
+        is only masked if it doesn't span partial lines. When coalescing
+        lines, an empty line is yielded once no output has arrived for the
+        coalescing window, so that the lines coalesced so far can be flushed
+        """
+        partial_line = ''
+        is_idle = True
+        while True:
+            started_at = time.time()
+            deadline = None
+            if partial_line:
+                deadline = started_at + self._partial_line_timeout
+            elif not is_idle and self._idle_timeout is not None:
+                deadline = started_at + self._idle_timeout
+
+            if self._can_wait and \
+                (deadline is not None or self._scheduler) and \
+                not self._wait(deadline):
+                if partial_line:
+                    line, partial_line = self._split_partial_line(partial_line)
+                    if line:
+                        yield line
+                else:
+                    is_idle = True
+                    yield ''
+                continue
+
+            chunk = os.read(self._fd, self._chunk_size)
+            self._run_stats.record_time('pipe_read', time.time() - started_at)
+            if not chunk:
+                break
+            self._run_stats.increment('bytes_read', len(chunk))
+            is_idle = False
+
+            # Output that keeps on coming never leaves the stream waiting,
+            # so deadlines are also run as it is read.
+            if self._scheduler:
+                self._scheduler.run_due()
+
+            if partial_line:
+                chunk = partial_line + chunk
+            end = chunk.rfind('\n') + 1
+            partial_line = chunk[end:]
+            if end:
+                for line in self._split_lines(chunk[:end]):
+                    yield line
+
+            if len(partial_line) >= self._max_partial_line_length:
+                line, partial_line = self._split_partial_line(partial_line)
+                if line:
+                    yield line
+
+        if partial_line:
+            yield self._normalize(self._secret_masker.mask(partial_line))
+
+    def _wait(self, deadline):
+        """
+        Waits for the stream to be readable, running the deadlines of the
+        scheduler, if any, as they come up in the meantime. Returns False if
+        the deadline passes first
+        """
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(0, deadline - time.time())
+            if self._scheduler:
+                scheduler_timeout = self._scheduler.get_timeout()
+                if timeout is None or scheduler_timeout is not None and \
+                    scheduler_timeout < timeout:
+                    timeout = scheduler_timeout
+
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if readable:
+                return True
+            if self._scheduler:
+                self._scheduler.run_due()
+            if deadline is not None and time.time() >= deadline:
+                return False
+
+    def _split_lines(self, lines):
+        """
+        Returns an iterator over complete lines, only normalizing them if
+        there is anything to normalize. Secrets are masked in all the lines
+        at once, as they don't span lines
+        """
+        lines = self._secret_masker.mask(lines)
+        if self._collapse_carriage_returns and '\r' in lines or \
+            self._strip_ansi_sequences and '\x1b' in lines:
+            return itertools.imap(self._normalize, StringIO(lines))
+        return StringIO(lines)
+
+    def _normalize(self, line):
+        """
+        Collapses carriage return rewrites, e.g. of progress bars, into the
+        final state of the line and strips ANSI escape sequences, if enabled
+        """
+        if self._collapse_carriage_returns and '\r' in line:
+            return collapse_carriage_returns(line, self._strip_ansi_sequences)
+        if self._strip_ansi_sequences and '\x1b' in line:
+            return ANSI_SEQUENCE.sub('', line)
+        return line
+
+    def _split_partial_line(self, partial_line):
+        """
+        Returns the part of a partial line to yield and the part to keep.
+        When collapsing carriage returns, only the state as of the last
+        carriage return is yielded, so that a progress update that is still
+        being written isn't cut in half. Otherwise a character that is still
+        being written is kept, so that it isn't cut in half either
+        """
+        partial_line = self._secret_masker.mask(partial_line)
+        if self._collapse_carriage_returns:
+            last_carriage_return = partial_line.rfind('\r')
+            if last_carriage_return >= 0:
+                return self._normalize(partial_line[:last_carriage_return]), \
+                    partial_line[last_carriage_return + 1:]
+        end = get_character_boundary(partial_line, len(partial_line))
+        return self._normalize(partial_line[:end]), partial_line[end:]
+
+def collapse_carriage_returns(line, strip_ansi_sequences=False):
+    """
+    Returns the text a terminal would show for a line that is rewritten with
+    carriage returns. Each carriage return goes back to the start of the line
+    and the text after it overwrites what was there, unless it erases the
+    line with an ANSI sequence first
+    """
+    newline = ''
+    if line[-1:] == '\n':
+        line = line[:-1]
+        newline = '\n'
+
+    # Later segments are on top, so go through them from the last one and
+    # only take what sticks out from underneath those.
+    visible = ''
+    for segment in reversed(line.split('\r')):
+        is_erased = False
+        if strip_ansi_sequences and '\x1b' in segment:
+            is_erased = ERASE_IN_LINE.search(segment) is not None
+            segment = ANSI_SEQUENCE.sub('', segment)
+        if len(segment) > len(visible):
+            visible += segment[len(visible):]
+        if is_erased:
+            break
+    return visible + newline
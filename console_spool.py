@@ -0,0 +1,266 @@
+"""
+Spools serialized consoles to disk until they are acknowledged by the API
+"""
+
+import errno
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+class ConsoleSpool(object):
+    """
+    Opens the spool file at the given path along with the checkpoint of the
+    offset up to which its consoles have been acknowledged, and the ranges
+    past it that have been acknowledged as well. Reading resumes from the
+    checkpoint
+    """
+    # Durable spools of this process that are still being written, by path
+    _writing_spools = weakref.WeakValueDictionary()
+
+    def __init__(self, path, is_durable):
+        self._spool_path = path + '.spool'
+        self._checkpoint_path = path + '.offset'
+        self._acknowledgements_path = path + '.acks'
+        self._is_durable = is_durable
+        self._lock = threading.Lock()
+        self._end_offset = None
+
+        buffer_size = 0
+        self._write_file = open(self._spool_path, 'ab', buffer_size)
+        self._read_file = open(self._spool_path, 'rb')
+
+        self.acknowledged_offset = 0
+        if os.path.isfile(self._checkpoint_path):
+            with open(self._checkpoint_path) as checkpoint:
+                self.acknowledged_offset = int(checkpoint.read() or 0)
+
+        # Ranges acknowledged while an earlier one was still pending, or
+        # after it was dropped. They are appended to a file of their own as
+        # they come in, a line that was being written when the run was
+        # killed is ignored.
+        self._acknowledged_ranges = []
+        if os.path.isfile(self._acknowledgements_path):
+            with open(self._acknowledgements_path) as acknowledgements:
+                for acknowledgement in acknowledgements:
+                    offsets = acknowledgement.split()
+                    if acknowledgement[-1:] == '\n' and len(offsets) == 2:
+                        self._acknowledged_ranges.append(
+                            (int(offsets[0]), int(offsets[1])))
+            self._advance_acknowledged_offset()
+        self._read_file.seek(self.acknowledged_offset)
+        self.read_offset = self.acknowledged_offset
+
+    @staticmethod
+    def create(config):
+        """
+        Creates the spool for a run. It lives in CONSOLE_SPOOL_DIR, if set,
+        so that it can be drained if the run doesn't get to post all of it.
+        Otherwise it is a temporary file
+        """
+        if not config['CONSOLE_SPOOL_DIR']:
+            path = os.path.join(tempfile.mkdtemp(), 'logs')
+            return ConsoleSpool(path, False)
+
+        spool_dir = ConsoleSpool._get_spool_dir(config)
+        if not os.path.isdir(spool_dir):
+            os.makedirs(spool_dir)
+        name = '{0}-{1}'.format(int(time.time() * 1000000), os.getpid())
+        path = os.path.join(spool_dir, name)
+        console_spool = ConsoleSpool(path, True)
+        ConsoleSpool._writing_spools[os.path.abspath(path + '.spool')] = \
+            console_spool
+        return console_spool
+
+    @staticmethod
+    def find(config):
+        """
+        Returns the spools left behind by earlier runs of the job, oldest
+        first. Spools of runs that are still writing them are left to those
+        """
+        if not config['CONSOLE_SPOOL_DIR']:
+            return []
+
+        paths = glob.glob(
+            os.path.join(ConsoleSpool._get_spool_dir(config), '*.spool'))
+        return [ConsoleSpool(path[:-len('.spool')], True)
+                for path in sorted(paths)
+                if not ConsoleSpool._is_being_written(path)]
+
+    @staticmethod
+    def _is_being_written(path):
+        """
+        Returns whether a spool is still being written, by a run of this
+        process or by the process that created it, going by the pid in its
+        name
+        """
+        pid = os.path.basename(path)[:-len('.spool')].rpartition('-')[2]
+        if not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return os.path.abspath(path) in ConsoleSpool._writing_spools
+        return _is_running(int(pid))
+
+    @staticmethod
+    def _get_spool_dir(config):
+        """
+        Returns the directory holding the spools of the job
+        """
+        return os.path.join(
+            config['CONSOLE_SPOOL_DIR'], str(config['BUILD_JOB_ID']))
+
+    def write(self, data):
+        """
+        Appends serialized consoles to the spool
+        """
+        self._write_file.write(data)
+
+    def readline(self):
+        """
+        Returns the next complete line of the spool, or an empty string if
+        there is none yet. A line that is still being written is read again
+        once it's complete
+        """
+        line = self._read_file.readline()
+        if line and line[-1] != '\n':
+            self._read_file.seek(-len(line), os.SEEK_CUR)
+            return ''
+        self.read_offset += len(line)
+        return line
+
+    def seek(self, offset):
+        """
+        Continues reading at the offset, e.g. past consoles that were
+        acknowledged already
+        """
+        self._read_file.seek(offset)
+        self.read_offset = offset
+
+    def acknowledge(self, start_offset, end_offset):
+        """
+        Records that the consoles between the offsets were posted. The
+        checkpoint only moves forward over contiguous ranges, so that a
+        batch that was dropped is posted again when the spool is drained.
+        Ranges past it are kept, so that only the dropped batch is
+        """
+        with self._lock:
+            if end_offset <= self.acknowledged_offset:
+                return
+            if self._is_durable:
+                with open(self._acknowledgements_path, 'a') as \
+                    acknowledgements:
+                    acknowledgements.write(
+                        '{0} {1}\n'.format(start_offset, end_offset))
+            self._acknowledged_ranges.append((start_offset, end_offset))
+            checkpoint_offset = self.acknowledged_offset
+            self._advance_acknowledged_offset()
+            if self._is_durable and \
+                self.acknowledged_offset != checkpoint_offset:
+                with open(self._checkpoint_path, 'w') as checkpoint:
+                    checkpoint.write(str(self.acknowledged_offset))
+            self._remove_if_acknowledged()
+
+    def get_acknowledged_end(self, offset):
+        """
+        Returns the end of the acknowledged range that starts at the offset,
+        the checkpoint if the offset is before it, or None if neither
+        """
+        with self._lock:
+            if offset < self.acknowledged_offset:
+                return self.acknowledged_offset
+            for start_offset, end_offset in self._acknowledged_ranges:
+                if start_offset == offset:
+                    return end_offset
+            return None
+
+    def _advance_acknowledged_offset(self):
+        """
+        Moves the acknowledged offset over the ranges that it has reached,
+        and forgets them
+        """
+        is_advanced = True
+        while is_advanced:
+            is_advanced = False
+            for start_offset, end_offset in self._acknowledged_ranges:
+                if start_offset <= self.acknowledged_offset < end_offset:
+                    self.acknowledged_offset = end_offset
+                    is_advanced = True
+        self._acknowledged_ranges = [
+            (start_offset, end_offset)
+            for start_offset, end_offset in self._acknowledged_ranges
+            if end_offset > self.acknowledged_offset
+        ]
+
+    def truncate(self):
+        """
+        Empties the spool, e.g. once every line in it has been read, so that
+        it doesn't keep growing on disk
+        """
+        with self._lock:
+            self._write_file.truncate(0)
+            self._read_file.seek(0)
+            self.read_offset = 0
+            self.acknowledged_offset = 0
+            self._acknowledged_ranges = []
+
+    def finish(self, end_offset=None):
+        """
+        Marks the spool as posted up to end_offset. A temporary spool is
+        removed right away, a durable one once it's acknowledged up to
+        end_offset. Without one, a durable spool wasn't posted to the end
+        and is left for a later drain
+        """
+        with self._lock:
+            self._end_offset = end_offset
+            ConsoleSpool._writing_spools.pop(
+                os.path.abspath(self._spool_path), None)
+            if not self._is_durable:
+                self._remove()
+            else:
+                self._remove_if_acknowledged()
+
+    def is_acknowledged(self):
+        """
+        Returns whether the spool is finished and acknowledged up to its end
+        """
+        return self._end_offset is not None and \
+            self.acknowledged_offset >= self._end_offset
+
+    def _remove_if_acknowledged(self):
+        """
+        Removes the spool once everything in it has been acknowledged
+        """
+        if self.is_acknowledged():
+            self._remove()
+
+    def _remove(self):
+        """
+        Closes and deletes the spool, its checkpoint and acknowledgements
+        """
+        self._write_file.close()
+        self._read_file.close()
+        if self._is_durable:
+            for path in [self._spool_path, self._checkpoint_path,
+                         self._acknowledgements_path]:
+                if os.path.isfile(path):
+                    os.remove(path)
+        else:
+            shutil.rmtree(
+                os.path.dirname(self._spool_path), ignore_errors=True)
+
+def _is_running(pid):
+    """
+    Returns whether a process is running. Windows has no signal to check
+    that with, os.kill() terminates the process there, so it's taken to
+    have exited
+    """
+    if os.name == 'nt':
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        return ex.errno == errno.EPERM
+    return True
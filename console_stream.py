@@ -0,0 +1,198 @@
+"""
+Runs a script and streams its output to the buildJobConsoles API
+"""
+
+import subprocess
+import threading
+import time
+import traceback
+import os
+from console_batch import ConsoleBatch
+from console_id import get_console_id_generator
+from console_parser import ConsoleParser
+from console_reader import ConsoleReader
+from run_stats import RunStats, SAMPLE_INTERVAL
+from shippable_adapter import ShippableAdapter
+
+class ConsoleStream(object):
+    """
+    Sets up the stages that script output goes through: the reader and the
+    parser, the console buffer that batches consoles up, either in memory or
+    spooled to disk, and the adapter that posts them. Errors are collected
+    in a console group of their own
+    """
+    def __init__(self, config, console_buffer_class, shippable_adapter=None,
+                 run_stats=None):
+        # -------
+        # Private
+        # -------
+        self._config = config
+        self._run_stats = run_stats or RunStats()
+        self._shippable_adapter = \
+            shippable_adapter or ShippableAdapter(config, self._run_stats)
+        self._console_buffer = console_buffer_class(
+            config,
+            self._shippable_adapter,
+            self._run_stats,
+            self._append_to_error_buffer
+        )
+
+        # Console state
+        self._new_console_id = get_console_id_generator(config)
+        self._console_parser = ConsoleParser(
+            config,
+            self._new_console_id,
+            self._console_buffer.append,
+            self._append_to_error_buffer
+        )
+
+        # Errors
+        self._error_grp = {
+            'consoleId': self._new_console_id(),
+            'parentConsoleId': 'root',
+            'type': 'grp',
+            'message': 'Error',
+            'timestamp': ConsoleStream._get_timestamp(),
+            'isSuccess': False
+        }
+        self._error_buffer = \
+            ConsoleBatch(config, config['CONSOLE_BUFFER_LENGTH'])
+        self._error_buffer.append(self._error_grp)
+        self._error_buffer_lock = threading.RLock()
+        self._has_errors = False
+
+        # ------
+        # Public
+        # ------
+
+        # Assume failure by default
+        self.exit_code = 1
+
+    def execute(self):
+        """
+        Runs the script while the console buffer posts its output, then
+        posts what is left along with any errors
+        """
+        self._console_buffer.start()
+        try:
+            self._script_runner()
+        finally:
+            dropped_bytes = self._console_buffer.finish()
+
+        if dropped_bytes:
+            self._append_to_error_buffer(
+                'Console output truncated: {0} bytes were dropped because '
+                'the Shippable API could not keep up'.format(dropped_bytes))
+        if self._has_errors:
+            self._flush_error_buffer()
+
+    def _script_runner(self):
+        """
+        Runs the script, handles console output and finally sets the exit code
+        """
+        # We need to unset the LD_LIBRARY_PATH set by pyinstaller. This
+        # will ensure the script prefers libraries on system rather
+        # than the ones bundled during build time.
+        env = dict(os.environ)
+        env.pop('LD_LIBRARY_PATH', None)
+
+        cmd = self._config['SCRIPT_PATH']
+
+        if self._config.get('REQEXEC_SHELL'):
+            cmd = [self._config['REQEXEC_SHELL'], self._config['SCRIPT_PATH']]
+
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=self._config['BUILD_DIR'],
+                env=env,
+                # Don't let scripts started concurrently by the server
+                # inherit each other's pipes, a script's output would only
+                # end once the other scripts exit as well. Not supported on
+                # Windows along with redirecting the output.
+                close_fds=os.name != 'nt'
+            )
+        except Exception as ex:
+            trace = traceback.format_exc()
+            error = '{0}: {1}'.format(str(ex), trace)
+            self._append_to_error_buffer(error)
+            return
+
+        try:
+            console_reader = ConsoleReader(
+                proc.stdout,
+                self._config,
+                self._run_stats,
+                self._console_buffer.scheduler
+            )
+            lines_read = 0
+            for lines_read, line in enumerate(console_reader.lines(), 1):
+                if lines_read % SAMPLE_INTERVAL:
+                    is_script_success, is_complete = \
+                        self._console_parser.parse(line)
+                else:
+                    started_at = time.time()
+                    is_script_success, is_complete = \
+                        self._console_parser.parse(line)
+                    self._run_stats.record_time(
+                        'parse', time.time() - started_at, SAMPLE_INTERVAL)
+
+                if is_script_success:
+                    self.exit_code = 0
+
+                if is_complete:
+                    break
+            self._console_parser.flush()
+        except Exception as ex:
+            trace = traceback.format_exc()
+            error = '{0}: {1}'.format(str(ex), trace)
+            self._append_to_error_buffer(error)
+
+        self._run_stats.increment('lines_read', lines_read)
+        proc.kill()
+
+    def _append_to_error_buffer(self, error):
+        """
+        Appends an error into errors buffer after ensuring it is not empty,
+        and flushes the buffer once it's full
+        """
+        if not error.strip():
+            return
+
+        error_msg = {
+            'consoleId': self._new_console_id(),
+            'parentConsoleId': self._error_grp['consoleId'],
+            'type': 'msg',
+            'message': error,
+            'timestamp': ConsoleStream._get_timestamp(),
+            'isSuccess': False
+        }
+        with self._error_buffer_lock:
+            self._has_errors = True
+            self._error_buffer.append(error_msg)
+            if self._error_buffer.is_full():
+                self._flush_error_buffer()
+
+    def _flush_error_buffer(self):
+        """
+        Flushes error buffer, along with the errors that come up while it's
+        flushed, e.g. one that can't be serialized. Those are left out and
+        reported in an error of their own that can be
+        """
+        with self._error_buffer_lock:
+            while self._error_buffer:
+                self._run_stats.record_max(
+                    'error_buffer_length', len(self._error_buffer))
+                for data in self._error_buffer.flush(
+                        self._append_to_error_buffer):
+                    self._console_buffer.post(data)
+
+    @staticmethod
+    def _get_timestamp():
+        """
+        Helper method to return timestamp in a format which is acceptable
+        for consoles
+        """
+        return int(time.time() * 1000000)
@@ -0,0 +1,61 @@
+"""
+Drainer posts consoles left in the spools of earlier runs of a job
+"""
+
+from console_spool import ConsoleSpool
+from run_stats import RunStats
+from shippable_adapter import ShippableAdapter
+from spool_poster import SpoolPoster
+
+class Drainer(object):
+    """
+    Sets up config for the job whose spools are to be drained
+    """
+    def __init__(self, config, shippable_adapter=None, run_stats=None):
+        self._config = config
+        self._run_stats = run_stats or RunStats()
+        self._shippable_adapter = \
+            shippable_adapter or ShippableAdapter(config, self._run_stats)
+        self._console_spools = []
+
+    @property
+    def exit_code(self):
+        """
+        Returns 0 once every spool has been acknowledged by the API
+        """
+        for console_spool in self._console_spools:
+            if not console_spool.is_acknowledged():
+                return 1
+        return 0
+
+    def execute(self):
+        """
+        Posts the consoles of every spool that weren't acknowledged yet,
+        oldest spool first
+        """
+        self._console_spools = ConsoleSpool.find(self._config)
+        for console_spool in self._console_spools:
+            self._drain(console_spool)
+
+    def _drain(self, console_spool):
+        """
+        Posts the consoles of a spool from its checkpoint onwards, except
+        the ones in ranges the API acknowledged already. Malformed lines,
+        e.g. one that was being written when the run was killed, are
+        skipped
+        """
+        spool_poster = SpoolPoster(
+            self._config, console_spool, self._shippable_adapter,
+            self._run_stats)
+        while True:
+            acknowledged_end = \
+                console_spool.get_acknowledged_end(console_spool.read_offset)
+            if acknowledged_end is not None:
+                spool_poster.skip(acknowledged_end)
+            elif not spool_poster.read():
+                break
+            elif spool_poster.batch.is_full():
+                spool_poster.post()
+
+        spool_poster.post()
+        spool_poster.finish()
@@ -0,0 +1,61 @@
+"""
+Buffers consoles in memory and flushes them from the loop that reads the
+script output
+"""
+
+import time
+from memory_console_buffer import MemoryConsoleBuffer
+
+class EventLoopConsoleBuffer(MemoryConsoleBuffer):
+    """
+    Buffers consoles the same as MemoryConsoleBuffer, but rather than on a
+    thread of its own, flushes them on the thread that reads the script
+    output. The reader waits for output and for the next flush in a single
+    select() call, so nothing wakes up while there is nothing to flush
+    """
+    def __init__(self, config, shippable_adapter, run_stats, append_error):
+        super(EventLoopConsoleBuffer, self).__init__(
+            config, shippable_adapter, run_stats, append_error)
+        self._flush_at = None
+
+        # ------
+        # Public
+        # ------
+
+        # The reader runs the flush deadlines of the buffer
+        self.scheduler = self
+
+    def start(self):
+        """
+        Sets the first flush deadline
+        """
+        self._flush_at = time.time() + self._flush_controller.wait
+
+    def get_timeout(self):
+        """
+        Returns the seconds until the next flush, or None if there is nothing
+        to flush
+        """
+        if not self._console_buffer and \
+            not self._console_backlog.is_spilled():
+            return None
+        return max(0, self._flush_at - time.time())
+
+    def run_due(self):
+        """
+        Flushes the buffer if it's time to, and sets the next deadline
+        """
+        now = time.time()
+        if now < self._flush_at:
+            return
+
+        self._flush_on_interval()
+        self._flush_at = now + self._flush_controller.wait
+
+    def _flush_sooner(self):
+        """
+        Pulls in the flush deadline for consoles that arrive once output has
+        been idle, so that they are flushed after the minimum interval
+        """
+        self._flush_at = min(
+            self._flush_at, time.time() + self._flush_controller.wait)
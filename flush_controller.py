@@ -0,0 +1,91 @@
+"""
+Adapts how often consoles are flushed and how many go in a batch
+"""
+
+import time
+
+# Weight of the latest measurement in the moving average of the output rate
+RATE_SMOOTHING = 0.5
+
+# The output rate is measured over at least this many seconds
+MIN_RATE_PERIOD_IN_S = 0.1
+
+class FlushController(object):
+    """
+    Sets up the bounds of the flush interval and the batch length. The
+    configured interval and length of the console buffer are the upper bound of
+    the former and the lower bound of the latter. If ADAPTIVE_CONSOLE_FLUSH
+    is turned off, they are used as they are
+    """
+    def __init__(self, config, max_wait, min_consoles, shippable_adapter):
+        self._is_adaptive = config['ADAPTIVE_CONSOLE_FLUSH']
+        self._min_wait = min(config['MIN_CONSOLE_FLUSH_INTERVAL_IN_S'],
+                             max_wait)
+        self._max_wait = max_wait
+        self._min_consoles = min_consoles
+        self._max_consoles = max(config['MAX_CONSOLE_BATCH_LENGTH'],
+                                 min_consoles)
+        self._in_flight_batches = \
+            config['SHIPPABLE_API_MAX_IN_FLIGHT_BATCHES']
+        self._shippable_adapter = shippable_adapter
+
+        self._consoles = 0
+        self._measured_at = time.time()
+        self._rate = 0.0
+
+        # ------
+        # Public
+        # ------
+        self.wait = self._max_wait
+        self.max_consoles = self._min_consoles
+        if self._is_adaptive:
+            self.wait = self._min_wait
+
+        # Whether no output arrived during the last interval, and the wait
+        # went back to the configured interval because of it
+        self.is_idle = False
+
+    def add(self, consoles=1):
+        """
+        Counts consoles towards the output rate. The first consoles after
+        output has gone idle are flushed after the minimum interval rather
+        than the configured one, returns True for those
+        """
+        self._consoles += consoles
+        if not self.is_idle:
+            return False
+        self.is_idle = False
+        self.wait = self._min_wait
+        return True
+
+    def update(self):
+        """
+        Updates the flush interval and the batch length. Consoles are
+        flushed after the minimum interval so that sparse output shows up
+        quickly, unless the API takes longer than that to respond to the
+        batches in flight. While no output arrives, it goes back to the
+        configured interval, so that a quiet script isn't woken up for more
+        often, until output resumes. The batch length is what arrives at
+        the current output rate during the interval or a POST, whichever is
+        longer, so that dense output and a slow API make for fewer, larger
+        batches
+        """
+        now = time.time()
+        period = now - self._measured_at
+        if not self._is_adaptive or period < MIN_RATE_PERIOD_IN_S:
+            return
+
+        consoles = self._consoles
+        self._rate = RATE_SMOOTHING * consoles / period + \
+            (1 - RATE_SMOOTHING) * self._rate
+        self._consoles = 0
+        self._measured_at = now
+
+        post_latency = self._shippable_adapter.post_latency
+        self.wait = self._max_wait
+        self.is_idle = not consoles
+        if consoles:
+            self.wait = min(self._max_wait, max(
+                self._min_wait, post_latency / self._in_flight_batches))
+        self.max_consoles = int(min(self._max_consoles, max(
+            self._min_consoles, self._rate * max(self.wait, post_latency))))
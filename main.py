@@ -4,13 +4,29 @@ Entrypoint to reqExec
 
 import sys
 from config import Config
-from executor import Executor
-from executor2 import Executor2
+from console_stream import ConsoleStream
+from drainer import Drainer
+from event_loop_console_buffer import EventLoopConsoleBuffer
+from memory_console_buffer import MemoryConsoleBuffer
+from run_stats import RunStats, report_run_stats
+from sampling_profiler import SamplingProfiler
+from shippable_adapter import ShippableAdapter
+from spooled_console_buffer import SpooledConsoleBuffer
+
+# Console buffers, as selected by CONSOLE_BUFFER
+CONSOLE_BUFFERS = {
+    'memory': MemoryConsoleBuffer,
+    'spool': SpooledConsoleBuffer,
+    'event_loop': EventLoopConsoleBuffer
+}
 
 def main():
     """
-    Calls the executor to execute a script along with required job
-    config
+    Streams the consoles of a script to the API, buffered as the job
+    config selects. With --drain in place of the script, posts the consoles
+    that earlier runs of the job left in CONSOLE_SPOOL_DIR instead. With
+    --serve in place of the script, and a socket path in place of the job
+    ENVs, keeps running scripts that are submitted over the socket
     """
     if len(sys.argv) < 2:
         print 'Missing script name'
@@ -22,14 +38,51 @@ def main():
         script_path = sys.argv[1]
         job_envs_path = sys.argv[2]
 
+    if script_path == '--serve':
+        # The server listens on a Unix domain socket, which Windows doesn't
+        # have, so it's only imported when it's used.
+        from server import ReqExecServer
+        ReqExecServer(job_envs_path, run_job).serve()
+        return
+
     config = Config(script_path, job_envs_path)
-    if config['IS_NEW_BUILD_RUNNER_SUBSCRIPTION']:
-        ex = Executor2(config)
+    profiler = None
+    if config['REQEXEC_PROFILE']:
+        profiler = SamplingProfiler(config)
+        profiler.start()
+
+    run_stats = RunStats()
+    shippable_adapter = ShippableAdapter(config, run_stats)
+    exit_code, drain_deadline = run_job(config, shippable_adapter, run_stats)
+    shippable_adapter.close(drain_deadline)
+    if profiler:
+        profiler.stop()
+        profiler.write(config['REQEXEC_PROFILE'])
+    sys.exit(exit_code)
+
+def run_job(config, shippable_adapter, run_stats=None):
+    """
+    Runs the script of a job, or drains its spools, waits for its consoles
+    to be posted and reports the run stats. Returns the exit code along
+    with the deadline the consoles were waited for until, so that posting
+    the run stats isn't waited for past it
+    """
+    run_stats = run_stats or RunStats()
+    if config['SCRIPT_PATH'] == '--drain':
+        ex = Drainer(config, shippable_adapter, run_stats)
     else:
-        ex = Executor(config)
+        ex = ConsoleStream(
+            config,
+            CONSOLE_BUFFERS[config['CONSOLE_BUFFER']],
+            shippable_adapter,
+            run_stats
+        )
 
     ex.execute()
-    sys.exit(ex.exit_code)
+    drain_deadline = shippable_adapter.get_drain_deadline()
+    shippable_adapter.flush(drain_deadline)
+    report_run_stats(config, run_stats, shippable_adapter)
+    return ex.exit_code, drain_deadline
 
 if __name__ == '__main__':
     main()
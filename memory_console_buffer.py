@@ -0,0 +1,140 @@
+"""
+Buffers consoles in memory and posts them in batches
+"""
+
+import threading
+import time
+from console_backlog import ConsoleBacklog
+from console_batch import ConsoleBatch
+from flush_controller import FlushController
+
+class MemoryConsoleBuffer(object):
+    """
+    Sets up the batch consoles are buffered in, flushed when full and in
+    intervals, and the backlog that bounds the memory taken by the batches
+    waiting to be posted
+    """
+    def __init__(self, config, shippable_adapter, run_stats, append_error):
+        self._run_stats = run_stats
+        self._append_error = append_error
+        self._is_executing = False
+        self._output_resumed = threading.Event()
+
+        self._console_buffer = \
+            ConsoleBatch(config, config['CONSOLE_BUFFER_LENGTH'])
+        self._console_buffer_lock = threading.Lock()
+        self._console_backlog = \
+            ConsoleBacklog(config, shippable_adapter, run_stats)
+        self._flush_controller = FlushController(
+            config,
+            config['CONSOLE_FLUSH_INTERVAL_SECONDS'],
+            config['CONSOLE_BUFFER_LENGTH'],
+            shippable_adapter
+        )
+
+        # ------
+        # Public
+        # ------
+
+        # The buffer is flushed on a thread of its own
+        self.scheduler = None
+
+    def start(self):
+        """
+        Starts flushing the buffer in intervals
+        """
+        self._is_executing = True
+        console_flush_thread = threading.Thread(
+            target=self._flush_in_intervals)
+        # Don't keep the process around for a flush that has nothing to do.
+        console_flush_thread.daemon = True
+        console_flush_thread.start()
+
+    def finish(self):
+        """
+        Stops flushing in intervals and posts what is left. Returns the
+        number of bytes that had to be dropped
+        """
+        self._is_executing = False
+        self._output_resumed.set()
+        self._flush_console_buffer()
+        return self._console_backlog.close()
+
+    def append(self, console_out):
+        """
+        Pushes a console line to buffer after taking over lock
+        """
+        with self._console_buffer_lock:
+            if self._flush_controller.add():
+                self._flush_sooner()
+            if not self._console_buffer.fits(console_out):
+                self._post_console_buffer()
+            self._console_buffer.append(console_out)
+            if self._console_buffer.is_full():
+                self._post_console_buffer()
+
+    def post(self, data):
+        """
+        Posts a request body through the backlog
+        """
+        self._console_backlog.post(data)
+
+    def _flush_in_intervals(self):
+        """
+        Flushes the console buffer in intervals set by the flush controller
+        until the script has finished execution. The thread sleeps rather
+        than waiting on an event with a timeout, which Python 2 polls for
+        every 50ms. While output is idle and there is nothing to flush, it
+        waits on an event without a timeout, which doesn't poll, until
+        output resumes
+        """
+        while self._is_executing:
+            self._output_resumed.clear()
+            if self._flush_controller.is_idle and \
+                not self._console_buffer and \
+                not self._console_backlog.is_spilled():
+                self._output_resumed.wait()
+                continue
+
+            time.sleep(self._flush_controller.wait)
+            if not self._is_executing:
+                return
+            self._flush_on_interval()
+
+    def _flush_sooner(self):
+        """
+        Wakes up the flush thread for consoles that arrive once output has
+        been idle, so that they are flushed after the minimum interval
+        """
+        self._output_resumed.set()
+
+    def _flush_on_interval(self):
+        """
+        Adapts the batch length to the output rate and flushes the console
+        buffer, along with the spilled bodies there is room for by now
+        """
+        with self._console_buffer_lock:
+            self._flush_controller.update()
+            self._console_buffer.max_consoles = \
+                self._flush_controller.max_consoles
+        self._flush_console_buffer()
+        self._console_backlog.refill()
+
+    def _flush_console_buffer(self):
+        """
+        Flushes console buffer after taking over lock
+        """
+        if self._console_buffer:
+            with self._console_buffer_lock:
+                self._post_console_buffer()
+
+    def _post_console_buffer(self):
+        """
+        Posts and empties the console buffer, the lock must be held
+        """
+        started_at = time.time()
+        self._run_stats.record_max(
+            'console_buffer_length', len(self._console_buffer))
+        for data in self._console_buffer.flush(self._append_error):
+            self._console_backlog.post(data)
+        self._run_stats.record_time('batch', time.time() - started_at)
@@ -0,0 +1,22 @@
+"""
+Request bodies for the buildJobConsoles API, either a string or, when they
+are streamed, a list of chunks that make up the body
+"""
+
+import itertools
+
+def get_body_size(body):
+    """
+    Returns the size of a request body in bytes
+    """
+    if isinstance(body, basestring):
+        return len(body)
+    return sum(itertools.imap(len, body))
+
+def join_body(body):
+    """
+    Returns a request body as a single string
+    """
+    if isinstance(body, basestring):
+        return body
+    return ''.join(body)
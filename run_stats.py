@@ -0,0 +1,156 @@
+"""
+Counters and timings of where reqExec spends its time during a run
+"""
+
+import json
+import threading
+import time
+from console_id import random_console_id
+
+# Per line phases are only timed for one in this many lines, timing every
+# line would cost about as much as parsing it.
+SAMPLE_INTERVAL = 64
+
+class RunStats(object):
+    """
+    Sets up empty counters, maximums and timings. Everything is safe to
+    record from any thread
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._maximums = {}
+        self._timings = {}
+
+    def increment(self, name, value=1):
+        """
+        Adds value to a counter
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record_max(self, name, value):
+        """
+        Keeps the largest value seen, e.g. of a queue depth
+        """
+        with self._lock:
+            if name not in self._maximums or value > self._maximums[name]:
+                self._maximums[name] = value
+
+    def record_time(self, name, seconds, sample_interval=1):
+        """
+        Adds a duration to a timing. A timing that is only recorded for one
+        in sample_interval calls is scaled up accordingly in the summary
+        """
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = Timing(sample_interval)
+            timing.add(seconds)
+
+    def get_summary(self):
+        """
+        Returns all stats as a dict that can be serialized to JSON
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'maximums': dict(self._maximums),
+                'timings': dict(
+                    (name, timing.get_summary())
+                    for name, timing in self._timings.iteritems())
+            }
+
+def report_run_stats(config, run_stats, shippable_adapter):
+    """
+    Writes the run stats to REQEXEC_STATS_PATH, and posts them in a hidden
+    console group if POST_REQEXEC_STATS is set
+    """
+    summary = json.dumps(run_stats.get_summary(), indent=2, sort_keys=True)
+    if config['REQEXEC_STATS_PATH']:
+        with open(config['REQEXEC_STATS_PATH'], 'w') as stats_file:
+            stats_file.write(summary)
+
+    if not config['POST_REQEXEC_STATS']:
+        return
+
+    timestamp = int(time.time() * 1000000)
+    stats_console_id = random_console_id()
+    shippable_adapter.post_build_job_consoles(json.dumps({
+        'buildJobId': config['BUILD_JOB_ID'],
+        'buildJobConsoles': [
+            {
+                'consoleId': stats_console_id,
+                'parentConsoleId': 'root',
+                'type': 'grp',
+                'message': 'Notice: reqExec stats',
+                'timestamp': timestamp,
+                'isShown': False
+            },
+            {
+                'consoleId': random_console_id(),
+                'parentConsoleId': stats_console_id,
+                'type': 'msg',
+                'message': summary,
+                'timestamp': timestamp
+            },
+            {
+                'consoleId': stats_console_id,
+                'parentConsoleId': 'root',
+                'type': 'grp',
+                'message': 'Notice: reqExec stats',
+                'timestamp': timestamp,
+                'timestampEndedAt': timestamp,
+                'isSuccess': True,
+                'isShown': False
+            }
+        ]
+    }))
+
+class Timing(object):
+    """
+    A histogram of durations in power of two microsecond buckets
+    """
+    __slots__ = ['_sample_interval', '_count', '_total', '_max', '_buckets']
+
+    def __init__(self, sample_interval):
+        self._sample_interval = sample_interval
+        self._count = 0
+        self._total = 0.0
+        self._max = 0.0
+        self._buckets = [0] * 64
+
+    def add(self, seconds):
+        """
+        Adds a duration
+        """
+        self._count += 1
+        self._total += seconds
+        if seconds > self._max:
+            self._max = seconds
+        self._buckets[int(seconds * 1000000).bit_length()] += 1
+
+    def get_summary(self):
+        """
+        Returns the count, total and maximum, along with percentiles that
+        are accurate to within a factor of two
+        """
+        return {
+            'count': self._count * self._sample_interval,
+            'total_seconds': self._total * self._sample_interval,
+            'max_seconds': self._max,
+            'p50_seconds': self._get_percentile(50),
+            'p90_seconds': self._get_percentile(90),
+            'p99_seconds': self._get_percentile(99)
+        }
+
+    def _get_percentile(self, percentile):
+        """
+        Returns the upper bound of the bucket the percentile falls in
+        """
+        remaining = self._count * percentile / 100.0
+        for bucket, count in enumerate(self._buckets):
+            remaining -= count
+            if remaining <= 0:
+                return min(self._max, (2 ** bucket) / 1000000.0)
+        return self._max
@@ -0,0 +1,81 @@
+"""
+Samples the stacks of all threads to find where reqExec spends its time
+"""
+
+import os
+import sys
+import threading
+import time
+
+class SamplingProfiler(object):
+    """
+    Sets up the interval between samples. Each sample walks the stack of
+    every thread, so the overhead is bounded by the interval rather than by
+    how busy reqExec is
+    """
+    def __init__(self, config):
+        self._interval = config['REQEXEC_PROFILE_INTERVAL_IN_S']
+        self._max_depth = config['REQEXEC_PROFILE_MAX_DEPTH']
+        self._stacks = {}
+        self._labels = {}
+        self._is_running = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts sampling in a background thread
+        """
+        self._is_running = True
+        self._thread = threading.Thread(target=self._sampler)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling and waits for the last sample to be taken
+        """
+        self._is_running = False
+        self._thread.join()
+
+    def write(self, path):
+        """
+        Writes the samples in the collapsed stack format used by flame graph
+        tools, one 'thread;outer;...;inner count' line per distinct stack
+        """
+        with open(path, 'w') as profile:
+            for stack, count in sorted(self._stacks.iteritems()):
+                profile.write('{0} {1}\n'.format(stack, count))
+
+    def _sampler(self):
+        """
+        Takes a sample every interval until stopped
+        """
+        own_thread_id = threading.current_thread().ident
+        while self._is_running:
+            time.sleep(self._interval)
+            thread_names = dict((thread.ident, thread.name)
+                                for thread in threading.enumerate())
+            # pylint: disable=protected-access
+            for thread_id, frame in sys._current_frames().iteritems():
+                if thread_id == own_thread_id:
+                    continue
+                stack = self._get_stack(
+                    thread_names.get(thread_id, str(thread_id)), frame)
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+
+    def _get_stack(self, thread_name, frame):
+        """
+        Returns the collapsed stack of a frame, outermost frame first
+        """
+        labels = []
+        while frame is not None and len(labels) < self._max_depth:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = '{0}:{1}'.format(
+                    os.path.basename(code.co_filename), code.co_name)
+            labels.append(label)
+            frame = frame.f_back
+        labels.append(thread_name)
+        labels.reverse()
+        return ';'.join(labels)
@@ -0,0 +1,207 @@
+"""
+Masks the values of secret job ENVs in script output
+"""
+
+import base64
+import re
+import string
+import struct
+
+# What a secret is replaced with
+MASK = '******'
+
+# Maps the base64 alphabet to the URL safe one
+URLSAFE_BASE64 = string.maketrans('+/', '-_')
+
+# Lengths of the pieces of output that are looked up among the pieces of the
+# secrets. Every secret is looked up with the longest that fits it twice
+GRAM_LENGTHS = (1, 2, 3, 4, 8, 16)
+
+# Pieces of output are split off this many at a time
+SAMPLE_BLOCK_LENGTH = 1024
+
+# Matching the pattern in a window of output around a piece that is found
+# costs about as much as matching it over this many more bytes of output
+WINDOW_OVERHEAD_BYTES = 1024
+
+class SecretMasker(object):
+    """
+    Compiles the values of the ENVs in SECRET_ENVS, along with their
+    base64 and URL-encoded forms, into a single pattern factored like a
+    trie of the values.
+
+    Matching even a trie at every position of the output gets slower the
+    more secrets there are, so the output is sampled first: a secret that
+    is at least 2n - 1 long contains one of the pieces of n characters
+    that the output is split into. Those pieces are looked up in a set of
+    all the pieces of the secrets, and the pattern is only matched around
+    the ones that are found
+    """
+    def __init__(self, config, secrets=None):
+        if secrets is None:
+            secrets = [config.get(env) for env in config['SECRET_ENVS']]
+        patterns = set()
+        for secret in secrets:
+            for pattern in self._get_encodings(secret or ''):
+                if len(pattern) >= config['MIN_SECRET_LENGTH']:
+                    patterns.add(pattern)
+
+        self._pattern = None
+        self._max_pattern_length = 0
+        self._samplers = []
+        if not patterns:
+            return
+
+        self._pattern = re.compile(_get_trie_pattern(sorted(patterns)))
+        self._max_pattern_length = max(len(pattern) for pattern in patterns)
+        grams = {}
+        for pattern in patterns:
+            length = max(length for length in GRAM_LENGTHS
+                         if 2 * length - 1 <= len(pattern))
+            grams.setdefault(length, set()).update(
+                pattern[start:start + length]
+                for start in xrange(len(pattern) - length + 1))
+        self._samplers = [
+            (struct.Struct('{0}s'.format(length) * SAMPLE_BLOCK_LENGTH),
+             length, length_grams)
+            for length, length_grams in sorted(grams.iteritems())
+        ]
+
+    def mask(self, text):
+        """
+        Returns the text with every secret in it replaced by the mask
+        """
+        windows = self._get_windows(text)
+        if not windows:
+            return text
+
+        pieces = []
+        end = 0
+        for window_start, window_end in windows:
+            pieces.append(text[end:window_start])
+            pieces.append(
+                self._pattern.sub(MASK, text[window_start:window_end]))
+            end = window_end
+        pieces.append(text[end:])
+        return ''.join(pieces)
+
+    def _get_windows(self, text):
+        """
+        Returns the sorted, disjoint ranges of the text that every secret in
+        it is within
+        """
+        found_grams = []
+        for sample_block, length, grams in self._samplers:
+            found_grams.extend(grams.intersection(
+                _sample(text, length, sample_block)))
+
+        # Output that the found pieces turn up all over, e.g. because the
+        # start of a secret is a common word, is matched as a whole rather
+        # than window by window.
+        window_cost = 2 * self._max_pattern_length + WINDOW_OVERHEAD_BYTES
+        if sum(text.count(gram) for gram in found_grams) * window_cost > \
+            len(text):
+            return [(0, len(text))]
+
+        windows = []
+        for gram in found_grams:
+            start = text.find(gram)
+            while start >= 0:
+                windows.append((
+                    max(0, start - self._max_pattern_length + len(gram)),
+                    start + self._max_pattern_length
+                ))
+                start = text.find(gram, start + 1)
+        windows.sort()
+
+        merged_windows = []
+        for start, end in windows:
+            if merged_windows and start <= merged_windows[-1][1]:
+                merged_start, merged_end = merged_windows.pop()
+                start, end = merged_start, max(end, merged_end)
+            merged_windows.append((start, end))
+        return merged_windows
+
+    @staticmethod
+    def _get_encodings(secret):
+        """
+        Returns the forms of a secret to mask. Output is masked a line at a
+        time, so a secret that spans lines is masked line by line
+        """
+        # urllib imports ssl, which takes longer than the rest of the start
+        # up, so it's only imported when there are secrets to encode.
+        import urllib
+
+        encodings = []
+        for line in secret.splitlines():
+            encodings.append(line)
+            encodings.append(urllib.quote(line, safe=''))
+            encodings.append(urllib.quote_plus(line, safe=''))
+
+            # A secret encoded along with other data, e.g. in basic auth
+            # credentials, starts at one of three offsets within the groups
+            # of three bytes that base64 encodes. Only the characters that
+            # are made up of the secret's bits alone are known.
+            for offset in xrange(3):
+                encoded = base64.b64encode('\0' * offset + line)
+                start = (offset * 8 + 5) / 6
+                end = (offset + len(line)) * 8 / 6
+                encoded = encoded[start:end]
+                encodings.append(encoded)
+                encodings.append(encoded.translate(URLSAFE_BASE64))
+        return encodings
+
+def _sample(text, length, sample_block):
+    """
+    Returns the pieces of the given length that the text is split into,
+    unpacking a block of them at a time
+    """
+    pieces = []
+    start = 0
+    while start + sample_block.size <= len(text):
+        pieces.extend(sample_block.unpack_from(text, start))
+        start += sample_block.size
+    pieces.extend(text[piece_start:piece_start + length] for piece_start in
+                  xrange(start, len(text) - length + 1, length))
+    return pieces
+
+def _get_trie_pattern(patterns):
+    """
+    Returns a regex that matches any of the sorted patterns, with their
+    common prefixes factored out. The longest pattern that matches wins
+    """
+    # Patterns that share a prefix are next to each other once sorted, so
+    # the trie can be built one level at a time by grouping them on their
+    # first character.
+    branches = []
+    is_optional = False
+    start = 0
+    while start < len(patterns):
+        if not patterns[start]:
+            is_optional = True
+            start += 1
+            continue
+
+        first = patterns[start][0]
+        end = start + 1
+        while end < len(patterns) and patterns[end][:1] == first:
+            end += 1
+        group = [pattern[1:] for pattern in patterns[start:end]]
+
+        # Runs of characters without branches are taken in one go, rather
+        # than a level of nesting for each of them.
+        prefix = first
+        while len(group) > 1 and all(group) and \
+            all(pattern[0] == group[0][0] for pattern in group):
+            prefix += group[0][0]
+            group = [pattern[1:] for pattern in group]
+        if len(group) == 1:
+            branches.append(re.escape(prefix + group[0]))
+        else:
+            branches.append(re.escape(prefix) + _get_trie_pattern(group))
+        start = end
+
+    pattern = '(?:{0})'.format('|'.join(branches))
+    if is_optional:
+        pattern += '?'
+    return pattern
@@ -0,0 +1,206 @@
+"""
+Runs the scripts of many jobs, submitted over a Unix domain socket
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import SocketServer
+import sys
+import threading
+import traceback
+from config import Config
+from shippable_adapter import ShippableAdapter
+
+# Fields that every request needs, the arguments reqExec is otherwise run with
+REQUEST_FIELDS = ['script_path', 'job_envs_path']
+
+class ReqExecServer(SocketServer.ThreadingMixIn,
+                    SocketServer.UnixStreamServer):
+    """
+    Listens on a Unix domain socket for scripts to run. A client sends a
+    line of JSON for every script, with the script_path and job_envs_path
+    that reqExec would otherwise be called with, e.g.
+
+        {"script_path": "/build/step.sh", "job_envs_path": "/build/job.env"}
+
+    and gets back a line with the exit code once the script has finished
+    and its consoles have been posted, e.g. {"exit_code": 0}. If the script
+    couldn't be run, the line has an error as well. Every connection is
+    handled in a thread of its own, so scripts of many jobs can run at the
+    same time. Jobs that use the same API settings share a ShippableAdapter,
+    along with its connection pool and sender threads, and post their
+    consoles through it with API tokens of their own
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, run_job):
+        # A socket file that nobody listens on is left over from an earlier
+        # server that was killed.
+        if os.path.exists(socket_path):
+            stale_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                stale_socket.connect(socket_path)
+            except socket.error:
+                os.remove(socket_path)
+            else:
+                raise Exception('reqExec is already serving on {0}'.format(
+                    socket_path))
+            finally:
+                stale_socket.close()
+
+        SocketServer.UnixStreamServer.__init__(
+            self, socket_path, _RequestHandler)
+        self._socket_path = socket_path
+        self._run_job = run_job
+        self._shippable_adapters = {}
+        self._shippable_adapters_lock = threading.Lock()
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+        self._logger = logging.getLogger(__name__)
+
+    def serve(self):
+        """
+        Serves until the process is interrupted or terminated, then waits
+        for the scripts that are running to finish and for the consoles
+        that are still queued to be posted. Terminating it again while it
+        waits exits right away
+        """
+        # There's no job config to take the log level from until a script
+        # comes along, the level is that of production runs.
+        logging.basicConfig(level=logging.WARNING)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            self.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server_close()
+
+    def server_close(self):
+        """
+        Stops listening, waits for the connections to be handled and closes
+        the adapters
+        """
+        SocketServer.UnixStreamServer.server_close(self)
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+
+        # Connections that are waiting for another script are told that no
+        # more are coming, ones that are running a script send its exit code
+        # before they're done.
+        with self._connections_lock:
+            connections = self._connections.items()
+        for connection, handler_thread in connections:
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except socket.error:
+                pass
+            handler_thread.join()
+
+        with self._shippable_adapters_lock:
+            for shippable_adapter in self._shippable_adapters.itervalues():
+                shippable_adapter.close()
+            self._shippable_adapters = {}
+
+    def process_request_thread(self, request, client_address):
+        """
+        Handles a connection in its own thread, keeping track of it until
+        it's closed
+        """
+        with self._connections_lock:
+            self._connections[request] = threading.current_thread()
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(
+                self, request, client_address)
+        finally:
+            with self._connections_lock:
+                del self._connections[request]
+
+    def run(self, line):
+        """
+        Runs the script of a request line and returns the response to send
+        back
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as ex:
+            return self._reject(line, 'invalid JSON: {0}'.format(str(ex)))
+        if not isinstance(request, dict):
+            return self._reject(line, 'request must be a JSON object')
+        for field in REQUEST_FIELDS:
+            if field not in request:
+                return self._reject(line, 'missing field: {0}'.format(field))
+            if not isinstance(request[field], basestring):
+                return self._reject(line, 'invalid field: {0}'.format(field))
+
+        try:
+            config = Config(request['script_path'], request['job_envs_path'])
+            shippable_adapter = _JobShippableAdapter(
+                self._get_shippable_adapter(config),
+                config['BUILDER_API_TOKEN'])
+            exit_code, _ = self._run_job(config, shippable_adapter)
+        except Exception as ex:
+            trace = traceback.format_exc()
+            error = '{0}: {1}'.format(str(ex), trace)
+            self._logger.error('Exception running %s: %s', request, error)
+            return {'exit_code': 1, 'error': str(ex)}
+        return {'exit_code': exit_code}
+
+    def _reject(self, line, error):
+        """
+        Logs a request that can't be run and returns the response to send
+        back
+        """
+        self._logger.error('Rejecting request %r: %s', line.strip(), error)
+        return {'exit_code': 1, 'error': error}
+
+    def _get_shippable_adapter(self, config):
+        """
+        Returns the adapter for the API settings of a job, creating it when
+        a job with these settings comes along for the first time. The API
+        token isn't one of them, so that there is an adapter for every API
+        rather than for every job that has been run
+        """
+        settings = tuple(sorted(
+            (key, value) for key, value in config.iteritems()
+            if key.startswith('SHIPPABLE_API_')
+        ))
+        with self._shippable_adapters_lock:
+            shippable_adapter = self._shippable_adapters.get(settings)
+            if not shippable_adapter:
+                shippable_adapter = ShippableAdapter(config)
+                self._shippable_adapters[settings] = shippable_adapter
+            return shippable_adapter
+
+class _JobShippableAdapter(object):
+    """
+    Posts the consoles of a job through an adapter that is shared with other
+    jobs, with the API token of the job. Everything else is left to the
+    shared adapter
+    """
+    def __init__(self, shippable_adapter, api_token):
+        self._shippable_adapter = shippable_adapter
+        self._api_token = api_token
+
+    def __getattr__(self, name):
+        return getattr(self._shippable_adapter, name)
+
+    def post_build_job_consoles(self, data, on_posted=None):
+        """
+        Queues consoles to be posted with the API token of the job
+        """
+        self._shippable_adapter.post_build_job_consoles(
+            data, on_posted, self._api_token)
+
+class _RequestHandler(SocketServer.StreamRequestHandler):
+    """
+    Runs the scripts that are sent over a connection one after the other
+    """
+    def handle(self):
+        for line in iter(self.rfile.readline, ''):
+            response = self.server.run(line)
+            self.wfile.write(json.dumps(response) + '\n')
+            self.wfile.flush()
@@ -3,35 +3,118 @@ Shippable API adapter
 """
 
 import logging
+import Queue
+import random
+import threading
 import time
 import traceback
-import requests
+import zlib
+from request_body import get_body_size
+from run_stats import RunStats
+
+# Streamed request bodies are sent in chunks of about this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
 
 class ShippableAdapter(object):
     """
     Initialize the API URL and token
     """
-    def __init__(self, config):
-        logging.getLogger("requests").setLevel(logging.WARNING)
-        requests.packages.urllib3.disable_warnings()
+    def __init__(self, config, run_stats=None):
+        self._config = config
+        self._run_stats = run_stats or RunStats()
+        self._timeout = (
+            config['SHIPPABLE_API_CONNECT_TIMEOUT_IN_S'],
+            config['SHIPPABLE_API_READ_TIMEOUT_IN_S']
+        )
 
-        self._api_url = config['SHIPPABLE_API_URL']
-        self._api_token = config['BUILDER_API_TOKEN']
-        self._retry_interval = config['SHIPPABLE_API_RETRY_INTERVAL']
+        # The session and the sender threads are only set up once the first
+        # batch is queued, so that they don't hold up starting the script.
+        self._session = None
+        self._sender_threads = []
 
         logging.basicConfig(level=config['LOG_LEVEL'])
         self._logger = logging.getLogger(__name__)
 
-    def _post(self, url, data):
+        # Batches are handed over to sender threads so that a slow or
+        # unavailable API never blocks the threads reading script output.
+        # Each sender keeps one batch in flight.
+        self._post_queue = Queue.Queue()
+        self._pending_batches = 0
+        self._pending_bytes = 0
+        self._pending_batches_condition = threading.Condition()
+        self._dropped_batches = 0
+        self._retrying_batches = 0
+
+        # Batches are numbered as they are queued, and are completed in that
+        # order even if their POSTs finish out of order.
+        self._queued_batches = 0
+        self._next_sequence_number = 0
+        self._finished_batches = {}
+
+        # ------
+        # Public
+        # ------
+
+        # Moving average of how long the API takes to respond to a POST
+        self.post_latency = 0.0
+
+    def _start(self):
+        """
+        Sets up the session and starts the sender threads. requests is
+        imported here rather than at startup, as importing it takes longer
+        than everything else reqExec does before it starts the script
+        """
+        import requests
+
+        logging.getLogger("requests").setLevel(logging.WARNING)
+        requests.packages.urllib3.disable_warnings()
+
+        # A single session keeps connections to the API alive across
+        # POSTs, so every flush doesn't pay for a new TCP/TLS handshake.
+        # The API token is sent with every request, as jobs that share an
+        # adapter in server mode have tokens of their own.
+        self._session = requests.Session()
+        self._session.headers.update({'Content-Type': 'application/json'})
+        pool_maxsize = max(self._config['SHIPPABLE_API_POOL_SIZE'],
+                           self._config['SHIPPABLE_API_MAX_IN_FLIGHT_BATCHES'])
+        pool_adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize
+        )
+        # Streamed bodies are sent over a connection taken straight from the
+        # pool, which doesn't get the timeout of the request, only the one
+        # of the pool.
+        pool_adapter.init_poolmanager(
+            1, pool_maxsize,
+            timeout=requests.packages.urllib3.Timeout(max(self._timeout))
+        )
+        self._session.mount('http://', pool_adapter)
+        self._session.mount('https://', pool_adapter)
+
+        for _ in xrange(self._config['SHIPPABLE_API_MAX_IN_FLIGHT_BATCHES']):
+            sender_thread = threading.Thread(target=self._sender)
+            sender_thread.daemon = True
+            sender_thread.start()
+            self._sender_threads.append(sender_thread)
+
+    def _post(self, url, data, headers):
         """
-        Generic POST request handler
+        Generic POST request handler. Returns False if the request failed
+        and should be retried. A body that is a list of chunks is streamed
+        with chunked transfer encoding
         """
-        headers = {
-            'Authorization': 'apiToken {0}'.format(self._api_token),
-            'Content-Type': 'application/json'
-        }
+        started_at = time.time()
+        chunk_sizes = []
+        body = data
+        if not isinstance(data, basestring):
+            body = self._stream(data, headers, chunk_sizes)
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = self._session.post(
+                url, data=body, headers=headers, timeout=self._timeout)
+            post_latency = time.time() - started_at
+            self._run_stats.record_time('post', post_latency)
+            self.post_latency = \
+                0.8 * self.post_latency + 0.2 * post_latency
             if response.status_code >= 500:
                 ex = 'API server error: {0} {1}'.format(
                     response.status_code, response.text)
@@ -45,12 +128,244 @@ class ShippableAdapter(object):
             trace = traceback.format_exc()
             error = '{0}: {1}'.format(str(ex), trace)
             self._logger.error('Exception POSTing to %s: %s', url, error)
-            time.sleep(self._retry_interval)
-            self._post(url, data)
+            self._run_stats.increment('post_failures')
+            return False
+
+        self._run_stats.increment('posts')
+        if body is data:
+            self._run_stats.increment('bytes_posted', len(data))
+        else:
+            self._run_stats.increment('bytes_posted', sum(chunk_sizes))
+        return True
+
+    def _stream(self, chunks, headers, chunk_sizes):
+        """
+        Yields the chunks of a request body joined into larger ones, and
+        compressed on the fly if there is a content encoding. The sizes of
+        the chunks are appended to chunk_sizes as they are sent
+        """
+        compressor = None
+        if 'Content-Encoding' in headers:
+            compressor = self._get_compressor(headers['Content-Encoding'])
+
+        pending_chunks = []
+        pending_size = 0
+        for chunk in chunks:
+            if compressor:
+                chunk = compressor.compress(chunk)
+            pending_chunks.append(chunk)
+            pending_size += len(chunk)
+            if pending_size >= STREAM_CHUNK_BYTES:
+                chunk = ''.join(pending_chunks)
+                pending_chunks = []
+                pending_size = 0
+                chunk_sizes.append(len(chunk))
+                yield chunk
+
+        if compressor:
+            pending_chunks.append(compressor.flush())
+        chunk = ''.join(pending_chunks)
+        if chunk:
+            chunk_sizes.append(len(chunk))
+            yield chunk
+
+    def _sender(self):
+        """
+        POSTs queued batches, and completes them in the order they were
+        queued
+        """
+        while True:
+            batch = self._post_queue.get()
+            if batch is None:
+                return
+
+            sequence_number, url, data, on_posted, api_token = batch
+            size = get_body_size(data)
+            data, headers = self._compress(data, size)
+            headers['Authorization'] = 'apiToken {0}'.format(api_token)
+
+            # Don't get further ahead of a batch that is being retried than
+            # the batches that are already in flight.
+            with self._pending_batches_condition:
+                while self._retrying_batches:
+                    self._pending_batches_condition.wait()
+
+            is_posted = self._post_with_retries(url, data, headers)
+            with self._pending_batches_condition:
+                self._pending_bytes -= size
+                self._finished_batches[sequence_number] = \
+                    on_posted if is_posted else None
+                self._complete_finished_batches()
+                self._pending_batches_condition.notify_all()
+
+    def _post_with_retries(self, url, data, headers):
+        """
+        POSTs a batch, retrying failures with exponential backoff until the
+        retry budget for the batch runs out. Returns whether it was posted
+        """
+        if self._post(url, data, headers):
+            return True
+
+        with self._pending_batches_condition:
+            self._retrying_batches += 1
+        is_posted = False
+        for retries in xrange(self._config['SHIPPABLE_API_MAX_RETRIES']):
+            time.sleep(self._get_retry_interval(retries))
+            self._run_stats.increment('post_retries')
+            if self._post(url, data, headers):
+                is_posted = True
+                break
+
+        with self._pending_batches_condition:
+            self._retrying_batches -= 1
+            if not is_posted:
+                self._logger.error(
+                    'Dropping batch to %s after %s retries', url,
+                    self._config['SHIPPABLE_API_MAX_RETRIES'])
+                self._dropped_batches += 1
+                self._run_stats.increment('batches_dropped')
+            self._pending_batches_condition.notify_all()
+        return is_posted
+
+    def _complete_finished_batches(self):
+        """
+        Completes the finished batches that every earlier batch has been
+        completed before, calling on_posted for the ones that were posted.
+        The condition must be held
+        """
+        while self._next_sequence_number in self._finished_batches:
+            on_posted = self._finished_batches.pop(self._next_sequence_number)
+            self._next_sequence_number += 1
+            self._pending_batches -= 1
+            if on_posted:
+                on_posted()
+
+    def _compress(self, data, size):
+        """
+        Compresses the request body if compression is enabled and the body is
+        large enough to benefit from it. Returns the body along with the
+        headers to send it with. Streamed bodies are compressed as they are
+        sent instead
+        """
+        content_encoding = self._config['SHIPPABLE_API_CONTENT_ENCODING']
+        if content_encoding == 'none' or \
+            size < self._config['SHIPPABLE_API_COMPRESSION_MIN_BYTES']:
+            return data, {}
+
+        if isinstance(data, basestring):
+            compressor = self._get_compressor(content_encoding)
+            data = compressor.compress(data) + compressor.flush()
+        return data, {'Content-Encoding': content_encoding}
+
+    def _get_compressor(self, content_encoding):
+        """
+        Returns a compressor for a content encoding, gzip or deflate
+        """
+        compression_level = self._config['SHIPPABLE_API_COMPRESSION_LEVEL']
+        if content_encoding == 'gzip':
+            return zlib.compressobj(
+                compression_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return zlib.compressobj(compression_level)
+
+    def _get_retry_interval(self, retries):
+        """
+        Returns the time to wait before the next retry. The interval doubles
+        with every retry up to a maximum, half of it being random jitter so
+        that many build nodes don't retry against the API in lockstep
+        """
+        interval = min(
+            self._config['SHIPPABLE_API_MAX_RETRY_INTERVAL_IN_S'],
+            self._config['SHIPPABLE_API_RETRY_INTERVAL'] * (2 ** retries))
+        return interval / 2.0 + random.uniform(0, interval / 2.0)
+
+    def _enqueue(self, url, data, on_posted, api_token):
+        """
+        Queues a request for the sender thread
+        """
+        with self._pending_batches_condition:
+            if not self._session:
+                self._start()
+            self._pending_batches += 1
+            self._pending_bytes += get_body_size(data)
+            self._run_stats.record_max(
+                'post_queue_depth', self._pending_batches)
+            self._run_stats.record_max(
+                'post_queue_bytes', self._pending_bytes)
+            self._post_queue.put(
+                (self._queued_batches, url, data, on_posted, api_token))
+            self._queued_batches += 1
+
+    def flush(self, deadline=None):
+        """
+        Waits for the batches queued so far to be sent, up to the deadline
+        or the drain timeout if there is none. Batches that other jobs queue
+        in the meantime aren't waited for. Returns the number of those
+        batches that are still pending
+        """
+        if deadline is None:
+            deadline = self.get_drain_deadline()
+        with self._pending_batches_condition:
+            queued_batches = self._queued_batches
+            while self._next_sequence_number < queued_batches and \
+                time.time() < deadline:
+                self._pending_batches_condition.wait(deadline - time.time())
+            return queued_batches - self._next_sequence_number
+
+    def get_drain_deadline(self):
+        """
+        Returns the time until which queued batches are waited for if
+        draining starts now
+        """
+        return time.time() + self._config['SHIPPABLE_API_DRAIN_TIMEOUT_IN_S']
+
+    def wait_for_pending_bytes(self, max_bytes, timeout=None):
+        """
+        Waits until the request bodies that are queued or being sent take up
+        at most max_bytes, or until the timeout. Returns whether they do
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._pending_batches_condition:
+            while self._pending_bytes > max_bytes:
+                if deadline is None:
+                    self._pending_batches_condition.wait()
+                elif time.time() < deadline:
+                    self._pending_batches_condition.wait(
+                        deadline - time.time())
+                else:
+                    return False
+            return True
+
+    def close(self, deadline=None):
+        """
+        Flushes queued batches up to the deadline, stops the sender threads
+        and closes all pooled connections to the API. Returns the number of
+        batches that could not be delivered
+        """
+        pending_batches = self.flush(deadline)
+        if pending_batches or self._dropped_batches:
+            self._logger.error(
+                'Console batches not delivered at exit: %s pending, '
+                '%s dropped', pending_batches, self._dropped_batches)
+
+        # Senders that are idle are stopped rather than left to be torn down
+        # with the interpreter. Ones that are still posting are left alone.
+        for _ in self._sender_threads:
+            self._post_queue.put(None)
+        if not pending_batches:
+            for sender_thread in self._sender_threads:
+                sender_thread.join()
+        if self._session:
+            self._session.close()
+        return pending_batches + self._dropped_batches
 
-    def post_build_job_consoles(self, data):
+    def post_build_job_consoles(self, data, on_posted=None, api_token=None):
         """
-        Posts stringified json of build job consoles
+        Queues stringified json of build job consoles to be posted with the
+        API token, that of the config if none is given. on_posted is called
+        once the API has responded to the request, and to every request
+        queued before it
         """
-        url = '{0}/buildJobConsoles'.format(self._api_url)
-        self._post(url, data)
+        url = '{0}/buildJobConsoles'.format(
+            self._config['SHIPPABLE_API_URL'])
+        self._enqueue(url, data, on_posted,
+                      api_token or self._config['BUILDER_API_TOKEN'])
@@ -0,0 +1,118 @@
+"""
+Reads serialized consoles back from a spool and posts them in batches
+"""
+
+import functools
+import time
+from console_batch import SerializedConsoleBatch
+from request_body import get_body_size
+
+class SpoolPoster(object):
+    """
+    Sets up the spool consoles are read from, the batch they are collected
+    in and the range of the spool that the batch covers, which is
+    checkpointed once the API acknowledges it
+    """
+    def __init__(self, config, console_spool, shippable_adapter, run_stats):
+        self._config = config
+        self._console_spool = console_spool
+        self._shippable_adapter = shippable_adapter
+        self._run_stats = run_stats
+
+        # Offsets into the spool of the consoles in the batch
+        self._start_offset = console_spool.read_offset
+        self._end_offset = self._start_offset
+
+        # ------
+        # Public
+        # ------
+        self.batch = SerializedConsoleBatch(
+            config, config['MAX_LOG_LINES_TO_FLUSH'])
+        self.posted_at = time.time()
+
+        # Posting is given up on past this, if set
+        self.deadline = None
+        self.is_past_deadline = False
+
+    def read(self, append_error=None):
+        """
+        Reads the next line of the spool into the batch, after posting the
+        batch if the line would take it over the size limit. A malformed
+        line is reported to append_error, if given, and skipped. Returns
+        False if there is no complete line to read yet
+        """
+        log_line = self._console_spool.readline()
+        if not log_line:
+            return False
+
+        # Lines are serialized consoles that are posted as they are, just
+        # make sure it's a complete JSON object. One that was being written
+        # when a run was killed isn't.
+        log_line = log_line[:-1]
+        if log_line[:1] == '{' and log_line[-1:] == '}':
+            if not self.batch.fits(log_line):
+                self.post()
+            self.batch.append(log_line)
+        elif append_error:
+            append_error('Malformed log line: {0}'.format(log_line))
+        self._end_offset = self._console_spool.read_offset
+        return True
+
+    def skip(self, offset):
+        """
+        Posts the batch and continues reading at the offset, e.g. past
+        consoles that were acknowledged already
+        """
+        self.post()
+        self._console_spool.seek(offset)
+        self._start_offset = self._end_offset = offset
+
+    def post(self):
+        """
+        Posts and empties the batch, if there is anything in it. Nothing is
+        posted once the deadline has passed, the consoles from the start of
+        the batch on are left in the spool
+        """
+        if not self.batch or self.is_past_deadline:
+            return
+
+        started_at = time.time()
+        self.posted_at = started_at
+        self._run_stats.record_max('logs_to_post_length', len(self.batch))
+        on_posted = functools.partial(
+            self._console_spool.acknowledge, self._start_offset,
+            self._end_offset)
+        for data in self.batch.flush(None):
+            if not self.post_body(data, on_posted):
+                return
+        self._start_offset = self._end_offset
+        self._run_stats.record_time('batch', time.time() - started_at)
+
+    def post_body(self, data, on_posted=None):
+        """
+        Posts a request body once the API has caught up enough for it to
+        fit under the memory ceiling. The consoles are on disk already, so
+        there is no point in queueing up more than that. Returns False if
+        the deadline passes first
+        """
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(0, self.deadline - time.time())
+        if not self._shippable_adapter.wait_for_pending_bytes(max(
+                0, self._config['MAX_CONSOLE_MEMORY_BYTES'] -
+                get_body_size(data)), timeout):
+            self.is_past_deadline = True
+            return False
+        self._shippable_adapter.post_build_job_consoles(data, on_posted)
+        return True
+
+    def finish(self):
+        """
+        Marks the spool as posted up to the start of the batch. Once the
+        deadline has passed, there is more to post than that, so the spool
+        is left for a later drain
+        """
+        if self.is_past_deadline:
+            self._console_spool.finish()
+        else:
+            self._console_spool.finish(self._start_offset)
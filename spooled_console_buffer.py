@@ -0,0 +1,186 @@
+"""
+Spools consoles to a log file and posts them from there in batches
+"""
+
+import itertools
+import json
+import threading
+import time
+import traceback
+from console_id import get_console_id_generator
+from console_message import serialize_console
+from console_spool import ConsoleSpool
+from flush_controller import FlushController
+from run_stats import SAMPLE_INTERVAL
+from spool_poster import SpoolPoster
+
+class SpooledConsoleBuffer(object):
+    """
+    Sets up the log file consoles are written to and the logger thread that
+    reads them back and posts them, flushed periodically or if a limit is
+    hit. The log file is checkpointed as batches are acknowledged, so that
+    the consoles that could not be posted are left for a later drain
+    """
+    def __init__(self, config, shippable_adapter, run_stats, append_error):
+        self._config = config
+        self._shippable_adapter = shippable_adapter
+        self._run_stats = run_stats
+        self._append_error = append_error
+        self._logger_thread = None
+
+        # Log file, and what reads it back and posts it
+        self._console_spool = ConsoleSpool.create(config)
+        self._spool_writes = itertools.count(1)
+        self._spool_poster = SpoolPoster(
+            config, self._console_spool, shippable_adapter, run_stats)
+
+        # The logger waits on these instead of polling the log file
+        self._log_file_updated = threading.Event()
+        self._is_script_complete = False
+
+        # ------
+        # Public
+        # ------
+
+        # The log file is read back and flushed on a thread of its own
+        self.scheduler = None
+
+    def start(self):
+        """
+        Starts the logger thread
+        """
+        self._logger_thread = threading.Thread(target=self.logger)
+        self._logger_thread.start()
+
+    def finish(self):
+        """
+        Wakes up the logger to post what is left up to the drain timeout and
+        waits for it to finish. Consoles are never dropped, those that could
+        not be posted by then are left in the log file for a later drain
+        """
+        self._spool_poster.deadline = \
+            self._shippable_adapter.get_drain_deadline()
+        self._is_script_complete = True
+        self._log_file_updated.set()
+        self._logger_thread.join()
+        return 0
+
+    def append(self, console_out):
+        """
+        Pushes a console line to the log file
+        """
+        try:
+            if next(self._spool_writes) % SAMPLE_INTERVAL:
+                self._console_spool.write(
+                    serialize_console(console_out) + '\n')
+            else:
+                started_at = time.time()
+                self._console_spool.write(
+                    serialize_console(console_out) + '\n')
+                self._run_stats.record_time(
+                    'spool_write', time.time() - started_at, SAMPLE_INTERVAL)
+            if not self._log_file_updated.is_set():
+                self._log_file_updated.set()
+        except Exception as ex:
+            trace = traceback.format_exc()
+            error = '{0}: {1}'.format(str(ex), trace)
+            self._append_error(error)
+
+    def post(self, data, on_posted=None):
+        """
+        Posts a request body once the API has caught up enough for it to
+        fit under the memory ceiling. Once the script has finished, that is
+        only waited for up to the drain deadline. Returns whether the body
+        was posted
+        """
+        return self._spool_poster.post_body(data, on_posted)
+
+    def logger(self):
+        """
+        Reads from the log file and flushes consoles periodically or
+        if a limit is hit. Stops at the drain deadline, the log file keeps
+        whatever is left
+        """
+        spool_poster = self._spool_poster
+        flush_controller = FlushController(
+            self._config,
+            self._config['MAX_LOGS_FLUSH_WAIT_TIME_IN_S'],
+            self._config['MAX_LOG_LINES_TO_FLUSH'],
+            self._shippable_adapter
+        )
+
+        # Add a hidden version notice.
+        # NOTE: Remove this once all jobs spool their consoles.
+        notice_console_id = get_console_id_generator(self._config)()
+        notice_message = 'Notice: Executor v2'
+        spool_poster.batch.append(json.dumps({
+            'consoleId': notice_console_id,
+            'parentConsoleId': 'root',
+            'type': 'grp',
+            'message': notice_message,
+            'timestamp': SpooledConsoleBuffer._get_timestamp(),
+            'isShown': False
+        }))
+
+        spool_poster.batch.append(json.dumps({
+            'consoleId': notice_console_id,
+            'parentConsoleId': 'root',
+            'type': 'grp',
+            'message': notice_message,
+            'timestamp': SpooledConsoleBuffer._get_timestamp(),
+            'timestampEndedAt': SpooledConsoleBuffer._get_timestamp(),
+            'isSuccess': True,
+            'isShown': False
+        }))
+
+        try:
+            while not spool_poster.is_past_deadline:
+                is_read = spool_poster.read(self._append_error)
+                if not is_read:
+                    # Reset the notification and read again, so that a line
+                    # written in between is either read now or wakes up the
+                    # wait below.
+                    self._log_file_updated.clear()
+                    is_read = spool_poster.read(self._append_error)
+
+                if is_read:
+                    flush_controller.add()
+
+                    # We added a new line, if the logs reached the max log
+                    # lines or size, post logs. The max log lines may have
+                    # grown with the output rate in the meantime.
+                    if spool_poster.batch.is_full():
+                        flush_controller.update()
+                        spool_poster.batch.max_consoles = \
+                            flush_controller.max_consoles
+                        if spool_poster.batch.is_full():
+                            spool_poster.post()
+                    continue
+
+                flush_controller.update()
+                spool_poster.batch.max_consoles = flush_controller.max_consoles
+                flush_wait_time = flush_controller.wait - \
+                    (time.time() - spool_poster.posted_at)
+                # If the script runner is done and there are no more logs to
+                # read, attempt to post any remaining logs and break.
+                if self._is_script_complete:
+                    spool_poster.post()
+                    break
+                # If its been a while since we posted logs, post.
+                elif flush_wait_time <= 0 and spool_poster.batch:
+                    spool_poster.post()
+                # Wait for more logs, or until it's time to post the pending
+                # ones.
+                else:
+                    self._log_file_updated.wait(
+                        flush_wait_time if spool_poster.batch else None)
+        finally:
+            spool_poster.finish()
+
+    @staticmethod
+    def _get_timestamp():
+        """
+        Helper method to return timestamp in a format which is acceptable
+        for consoles
+        """
+        return int(time.time() * 1000000)
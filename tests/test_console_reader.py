@@ -0,0 +1,95 @@
+"""
+Tests for reading script output and splitting it into lines
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from console_reader import ConsoleReader
+from run_stats import RunStats
+
+class ConsoleReaderTest(unittest.TestCase):
+    """
+    Splits output into lines, cutting lines that are too long or that
+    stop coming in
+    """
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.config = {
+            'CONSOLE_READ_CHUNK_SIZE': 1000,
+            'PARTIAL_LINE_FLUSH_TIMEOUT_IN_S': 0.05,
+            'MAX_PARTIAL_LINE_LENGTH': 4096,
+            'COLLAPSE_CARRIAGE_RETURNS': False,
+            'STRIP_ANSI_SEQUENCES': False,
+            'COALESCE_CONSOLE_LINES': False,
+            'SECRET_ENVS': [],
+            'MIN_SECRET_LENGTH': 6
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def read(self, stream):
+        """
+        Returns the lines read from the stream
+        """
+        return list(ConsoleReader(stream, self.config, RunStats()).lines())
+
+    def assert_whole_characters(self, lines, output):
+        """
+        Checks that the lines make up the output and that none of them
+        splits a UTF-8 encoded character
+        """
+        self.assertEqual(''.join(lines), output)
+        for line in lines:
+            line.decode('utf-8')
+
+    def test_cuts_line_at_character(self):
+        """
+        Cuts a line that is past the maximum partial line length between
+        characters, keeping the rest of it for the next piece
+        """
+        output = '\xe4\xb8\xad\xe6\x96\x87\xe5\xad\x97' * 30000 + '\n'
+        output_path = os.path.join(self.work_dir, 'output')
+        with open(output_path, 'w') as output_file:
+            output_file.write(output)
+        with open(output_path) as stream:
+            lines = self.read(stream)
+        self.assertGreater(len(lines), 1)
+        self.assert_whole_characters(lines, output)
+
+    def test_keeps_partial_character(self):
+        """
+        Keeps the start of a character that is still being written when the
+        partial line times out
+        """
+        output = 'progress ' + '\xe2\x96\x88' + '\n'
+        read_fd, write_fd = os.pipe()
+
+        def write():
+            """
+            Writes the output with a pause in the middle of a character
+            """
+            os.write(write_fd, output[:-2])
+            time.sleep(0.2)
+            os.write(write_fd, output[-2:])
+            os.close(write_fd)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        with os.fdopen(read_fd) as stream:
+            lines = self.read(stream)
+        writer.join()
+        self.assertEqual(lines[0], 'progress ')
+        self.assert_whole_characters(lines, output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Tests for draining the spools that earlier runs of a job left behind
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# pylint: disable=wrong-import-position
+from console_spool import ConsoleSpool
+from drainer import Drainer
+from run_stats import RunStats
+from spool_poster import SpoolPoster
+
+class FakeShippableAdapter(object):
+    """
+    Records the consoles it's asked to post, and drops the batches with
+    the given indexes instead of acknowledging them
+    """
+    def __init__(self, dropped_batches=()):
+        self.dropped_batches = dropped_batches
+        self.batches = []
+        self.is_behind = False
+
+    def post_build_job_consoles(self, data, on_posted=None):
+        """
+        Posts a batch right away, unless it's one to drop
+        """
+        consoles = json.loads(data)['buildJobConsoles']
+        self.batches.append([console['message'] for console in consoles])
+        if len(self.batches) - 1 not in self.dropped_batches and on_posted:
+            on_posted()
+
+    def wait_for_pending_bytes(self, max_bytes, timeout=None):
+        """
+        Batches are posted right away, nothing is pending unless the API is
+        behind, which it stays for longer than any timeout
+        """
+        # pylint: disable=unused-argument
+        return not self.is_behind
+
+class DrainerTest(unittest.TestCase):
+    """
+    Drains spools that a run could only post part of
+    """
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.config = {
+            'CONSOLE_SPOOL_DIR': self.spool_dir,
+            'BUILD_JOB_ID': 'job',
+            'MAX_LOG_LINES_TO_FLUSH': 10,
+            'MAX_CONSOLE_BATCH_BYTES': 512 * 1024,
+            'MAX_CONSOLE_MEMORY_BYTES': 16 * 1024 * 1024,
+            'SHIPPABLE_API_STREAM_REQUESTS': False
+        }
+        console_spool = ConsoleSpool.create(self.config)
+        for line in xrange(30):
+            console_spool.write(json.dumps({'message': str(line)}) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+
+    def drain(self, dropped_batches=()):
+        """
+        Drains the spool and returns the batches that were posted along with
+        the exit code
+        """
+        shippable_adapter = FakeShippableAdapter(dropped_batches)
+        drainer = Drainer(self.config, shippable_adapter)
+        drainer.execute()
+        return shippable_adapter.batches, drainer.exit_code
+
+    def test_drains_whole_spool(self):
+        """
+        Posts every console of a spool that nothing was posted from
+        """
+        batches, exit_code = self.drain()
+        self.assertEqual(
+            [message for batch in batches for message in batch],
+            [str(line) for line in xrange(30)])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(os.listdir(os.path.join(self.spool_dir, 'job')), [])
+
+    def test_drains_only_dropped_batch(self):
+        """
+        Posts only the batch that the API dropped during the run, not
+        the ones after it that it acknowledged
+        """
+        batches, exit_code = self.drain(dropped_batches=(1,))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(exit_code, 1)
+
+        batches, exit_code = self.drain()
+        self.assertEqual(batches, [[str(line) for line in xrange(10, 20)]])
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(os.listdir(os.path.join(self.spool_dir, 'job')), [])
+
+    def test_nothing_left_to_drain(self):
+        """
+        Posts nothing once a spool has been drained
+        """
+        self.drain(dropped_batches=(1,))
+        self.drain()
+        batches, exit_code = self.drain()
+        self.assertEqual(batches, [])
+        self.assertEqual(exit_code, 0)
+
+    def test_skips_spools_being_written(self):
+        """
+        Leaves the spools of runs that are still writing them alone, in
+        this process and in others
+        """
+        console_spool = ConsoleSpool.create(self.config)
+        console_spool.write(json.dumps({'message': 'running'}) + '\n')
+
+        sleeper = subprocess.Popen(['sleep', '30'])
+        try:
+            with open(os.path.join(self.spool_dir, 'job',
+                                   '0-{0}.spool'.format(sleeper.pid)),
+                      'w') as spool:
+                spool.write(json.dumps({'message': 'sleeping'}) + '\n')
+            batches, _ = self.drain()
+        finally:
+            sleeper.kill()
+            sleeper.wait()
+        self.assertEqual(
+            [message for batch in batches for message in batch],
+            [str(line) for line in xrange(30)])
+
+        batches, _ = self.drain()
+        self.assertEqual(batches, [['sleeping']])
+        del console_spool
+        batches, _ = self.drain()
+        self.assertEqual(batches, [['running']])
+
+    def test_drains_rest_after_deadline(self):
+        """
+        Leaves a spool for a later drain once its run stops posting at the
+        drain deadline, even though what it did post is acknowledged
+        """
+        shippable_adapter = FakeShippableAdapter()
+        spool_poster = SpoolPoster(
+            self.config, ConsoleSpool.find(self.config)[0],
+            shippable_adapter, RunStats())
+        for _ in xrange(10):
+            spool_poster.read()
+        spool_poster.post()
+        shippable_adapter.is_behind = True
+        for _ in xrange(10):
+            spool_poster.read()
+        spool_poster.post()
+        spool_poster.finish()
+        self.assertTrue(spool_poster.is_past_deadline)
+
+        batches, exit_code = self.drain()
+        self.assertEqual(
+            [message for batch in batches for message in batch],
+            [str(line) for line in xrange(10, 30)])
+        self.assertEqual(exit_code, 0)
+
+if __name__ == '__main__':
+    unittest.main()